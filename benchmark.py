@@ -0,0 +1,756 @@
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+from ticket_parser import TICKET_FIELDS, clean_texts, parse_ticket_info
+from station_index import STATIONS_PATH, StationIndex, low_confidence_texts
+from cascade import DEFAULT_FAST_CROP_HEIGHT, DEFAULT_MIN_CONFIDENCE, FAST_OCR_OVERRIDES, OCRCascade
+from preprocess import DEFAULT_CROP_HEIGHT, DEFAULT_CROP_SCALE, DEFAULT_DETECT_SCALE, REDUCED_SCALES, Preprocessor
+from dedupe import DEFAULT_HASH_SIZE, DEFAULT_MAX_DISTANCE, dhash, hamming, ticket_key
+
+# 基准数据：单票图片、Qwen3-VL 参考抽取结果、缓存的OCR文本
+SINGLE_TICKET_DIR = os.path.join("data", "ticket_single")
+REFERENCE_PATH = os.path.join("data", "ticket_result_qwen3-vl_8b.json")
+OCR_CACHE_PATH = os.path.join("data", "ticket_single_ocr.jsonl")
+BASELINE_PATH = "benchmark_baseline.json"
+
+# 冷启动评测：每条路径在全新的解释器中测量导入耗时与首次调用耗时
+STARTUP_PATHS = {
+    "parser": ("import ticket_parser",
+               "ticket_parser.parse_ticket_info(ticket_parser.clean_texts(texts))"),
+    "yolo_ocr-parse": ("import yolo_ocr",
+                       "yolo_ocr.parse_ticket_info(yolo_ocr.clean_texts(texts))"),
+    "pipeline": ("import yolo_ocr",
+                 "yolo_model, ocr = yolo_ocr.load_models(model)\n"
+                 "yolo_ocr.recognize_tickets(yolo_model.predict(source=image, verbose=False)[0], ocr)"),
+}
+STARTUP_SCRIPT = """
+import sys, json, time
+texts, model, image = json.loads(sys.argv[1])
+start = time.perf_counter()
+{import_code}
+imported = time.perf_counter()
+{call_code}
+done = time.perf_counter()
+heavy = [name for name in ("cv2", "paddle", "paddleocr", "torch", "ultralytics") if name in sys.modules]
+print(json.dumps({{"import": imported - start, "first_call": done - imported, "heavy": heavy}}))
+"""
+# 峰值内存评测：在全新的解释器中处理一个归档，输出处理的图片数、峰值常驻内存和耗时
+ARCHIVE_DIR = os.path.join("data", "ticket")
+MEMORY_SCRIPT = """
+import sys, json
+from yolo_ocr import process_ticket_batch
+from stage_timer import peak_rss_mb
+sources, model, output_dir, batch_size = json.loads(sys.argv[1])
+result = process_ticket_batch(sources, model_path=model, output_dir=output_dir, batch_size=batch_size)
+print(json.dumps({"images": result["images"], "elapsed": result["elapsed"], "peak_rss_mb": peak_rss_mb()}))
+"""
+# 无模型的峰值内存检查：用桩检测器和桩OCR代替 best.pt 与 PaddleOCR，只测量流水线本身是否随归档大小占用内存
+STUB_MEMORY_SCRIPT = """
+import sys, json
+import yolo_ocr
+from benchmark import StubDetector, StubOCR
+from stage_timer import peak_rss_mb
+sources, output_dir, batch_size, shape = json.loads(sys.argv[1])
+yolo_ocr.load_models = lambda *args, **kwargs: (StubDetector(shape), StubOCR())
+result = yolo_ocr.process_ticket_batch(sources, output_dir=output_dir, batch_size=batch_size)
+print(json.dumps({"images": result["images"], "elapsed": result["elapsed"], "peak_rss_mb": peak_rss_mb()}))
+"""
+# 桩检测器产出的整图尺寸（约 9 MB，与手机照片同一量级）
+STUB_IMAGE_SHAPE = (1500, 2000, 3)
+# 车站名录回归用例：(文本, 该文本块OCR置信度低, 期望站名)。识别可信的名录外站名不得改写，
+# 只有路线用语之后的已知站名才截取，置信度低时才在全部站名中纠正认错的字
+STATION_CASES = [
+    ("乌鲁木其", True, "乌鲁木齐"),
+    ("乌鲁木其", False, "乌鲁木其"),
+    ("开往西安北", False, "西安北"),
+    ("马鞍山", False, "马鞍山"),
+    ("马鞍山", True, "马鞍山"),
+    ("郑州南", True, "郑州南"),
+    ("随州南", False, "随州南"),
+    ("繁昌西", False, "繁昌西"),
+    ("嘉善南", False, "嘉善南"),
+    ("天门南", False, "天门南"),
+    ("铜陵北", False, "铜陵北"),
+    ("平顶山", False, "平顶山"),
+    ("平顶山", True, "平顶山"),
+    ("老河口东", False, "老河口东"),
+    ("老河口东", True, "老河口东"),
+]
+# 从名录中留出参考结果里的站名（含"西安"、"郑州"）后仍应原样保留的站名
+HELD_OUT_STATION_CASES = [
+    ("西安北", False, "西安北"),
+    ("郑州东", False, "郑州东"),
+    ("郑州西", False, "郑州西"),
+]
+SAMPLE_TEXTS = ["G1234", "北京南站", "上海虹桥站", "2023年01月02日08:00开", "05车12A号", "￥553.0元", "二等座", "张三"]
+
+DATETIME_PATTERN = re.compile(r'(\d{4})\D{1,3}(\d{1,2})\D{1,3}(\d{1,2})\D{0,3}?\s*(\d{1,2})[:：](\d{2})')
+# 参考结果中表示"无此字段"的取值，与解析器输出的空串等价
+EMPTY_VALUES = {"", "无", "全价票", "None"}
+
+
+def normalize_field(field, value):
+    """
+    统一参考结果与解析结果的格式差异，便于逐字段精确比对：
+    "2020-08-29 20:54:00" / "2020年08月29日 20:54" → "2020-08-29 20:54"，"民权站" → "民权"，
+    "无"/"全价票" → ""，票价统一为两位小数，车厢号去掉前导零
+    """
+    if value is None:
+        return ""
+    value = str(value).strip()
+    if value in EMPTY_VALUES:
+        return ""
+
+    if field == "datetime":
+        match = DATETIME_PATTERN.search(value)
+        if match:
+            year, month, day, hour, minute = match.groups()
+            return f"{year}-{int(month):02d}-{int(day):02d} {int(hour):02d}:{minute}"
+    elif field in ("departure_station", "arrival_station"):
+        return value[:-1] if value.endswith("站") and len(value) > 1 else value
+    elif field == "price":
+        try:
+            return f"{float(value.lstrip('￥').rstrip('元')):.2f}"
+        except ValueError:
+            return value
+    elif field == "carriage":
+        return value.lstrip("0") or "0"
+    elif field == "seat_num":
+        return value.upper()
+    return value
+
+
+def load_reference(path=REFERENCE_PATH):
+    """
+    读取参考抽取结果，返回 {图片文件名: 字段字典}
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        items = json.load(f)
+    return {os.path.basename(item["path"]): item["data"] for item in items}
+
+
+def reference_stations(reference):
+    """
+    参考结果中出现的全部站名（去掉"站"字）：评测车站名录时从名录中留出，避免在答案上评测
+    """
+    names = set()
+    for data in reference.values():
+        for field in ("departure_station", "arrival_station"):
+            name = (data.get(field) or "").strip()
+            names.add(name[:-1] if name.endswith("站") and len(name) > 2 else name)
+    names.discard("")
+    return names
+
+
+def read_ocr_records(path=OCR_CACHE_PATH):
+    """
+    读取缓存的OCR结果（JSON-lines，每行含 path/rec_texts/rec_scores/rec_boxes）
+    """
+    records = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                records.append(json.loads(line))
+    return records
+
+
+def score(predictions, reference):
+    """
+    逐字段比对解析结果与参考结果，返回 {field: {"correct", "total", "accuracy"}}，
+    另含 "_all"（所有字段合计）和 "_tickets"（全部字段都正确的车票）
+    """
+    scores = {field: {"correct": 0, "total": 0} for field in TICKET_FIELDS}
+    perfect = 0
+    matched = 0
+    for name, predicted in predictions.items():
+        expected = reference.get(name)
+        if expected is None:
+            continue
+        matched += 1
+        all_correct = True
+        for field in TICKET_FIELDS:
+            ok = normalize_field(field, predicted.get(field)) == normalize_field(field, expected.get(field))
+            scores[field]["total"] += 1
+            scores[field]["correct"] += ok
+            all_correct = all_correct and ok
+        perfect += all_correct
+
+    total_correct = sum(row["correct"] for row in scores.values())
+    total = sum(row["total"] for row in scores.values())
+    scores["_all"] = {"correct": total_correct, "total": total}
+    scores["_tickets"] = {"correct": perfect, "total": matched}
+    for row in scores.values():
+        row["accuracy"] = row["correct"] / row["total"] if row["total"] else 0.0
+    return scores
+
+
+def format_scores(scores):
+    lines = [f"{'field':<20}{'correct':>9}{'total':>7}{'accuracy':>10}", "-" * 46]
+    for field, row in scores.items():
+        lines.append(f"{field:<20}{row['correct']:>9}{row['total']:>7}{row['accuracy']:>10.2%}")
+    return "\n".join(lines)
+
+
+def load_baseline(baseline_path=BASELINE_PATH):
+    if not os.path.exists(baseline_path):
+        return {}
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def check_baseline(scores, mode, baseline_path=BASELINE_PATH, tolerance=0.0):
+    """
+    与固定的准确率基线（按评测模式分别保存）比对，
+    返回准确率下降超过 tolerance 的字段列表 [(field, baseline, current)]
+    """
+    baseline = load_baseline(baseline_path).get(mode, {})
+    regressions = []
+    for field, expected in baseline.items():
+        # 基线按4位小数保存，比较时保持相同精度
+        current = round(scores.get(field, {}).get("accuracy", 0.0), 4)
+        if current < expected - tolerance:
+            regressions.append((field, expected, current))
+    return regressions
+
+
+def save_baseline(scores, mode, baseline_path=BASELINE_PATH):
+    baseline = load_baseline(baseline_path)
+    baseline[mode] = {field: round(row["accuracy"], 4) for field, row in scores.items()}
+    with open(baseline_path, "w", encoding="utf-8") as f:
+        json.dump(baseline, f, ensure_ascii=False, indent=2)
+
+
+def bench_parser(records, reference, repeat=20, station_index=None):
+    """
+    在缓存的OCR文本上运行解析器（可选车站名录）：返回 (逐字段得分, tickets/sec)
+    """
+    texts = [(os.path.basename(record["path"]), clean_texts(record["rec_texts"]),
+              low_confidence_texts(record) if station_index is not None else ()) for record in records]
+    predictions = {name: parse_ticket_info(ocr_texts, station_index, uncertain_texts)
+                   for name, ocr_texts, uncertain_texts in texts}
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for _, ocr_texts, uncertain_texts in texts:
+            parse_ticket_info(ocr_texts, station_index, uncertain_texts)
+    elapsed = time.perf_counter() - start
+    throughput = len(texts) * repeat / elapsed if elapsed else 0.0
+    return score(predictions, reference), throughput
+
+
+def bench_layout(records, reference, repeat=20):
+    """
+    在同一批缓存OCR记录上对比按文本顺序解析（parse_ticket_info）与版面解析（parse_ticket_layout）：
+    返回 {"order": (逐字段得分, tickets/sec), "layout": (逐字段得分, tickets/sec)}
+    """
+    from layout_parser import parse_ticket_layout
+
+    parsers = {
+        "order": lambda record: parse_ticket_info(clean_texts(record["rec_texts"])),
+        "layout": parse_ticket_layout,
+    }
+    results = {}
+    for name, parse in parsers.items():
+        predictions = {os.path.basename(record["path"]): parse(record) for record in records}
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for record in records:
+                parse(record)
+        elapsed = time.perf_counter() - start
+        results[name] = (score(predictions, reference), len(records) * repeat / elapsed if elapsed else 0.0)
+    return results
+
+
+def format_comparison(base_scores, new_scores, labels=("order", "layout")):
+    lines = [f"{'field':<20}{labels[0]:>10}{labels[1]:>10}{'delta':>10}", "-" * 50]
+    for field, row in base_scores.items():
+        new_accuracy = new_scores[field]["accuracy"]
+        lines.append(f"{field:<20}{row['accuracy']:>10.2%}{new_accuracy:>10.2%}"
+                     f"{new_accuracy - row['accuracy']:>+10.2%}")
+    return "\n".join(lines)
+
+
+def build_ocr_cache(image_dir=SINGLE_TICKET_DIR, cache_path=OCR_CACHE_PATH):
+    """
+    对单票图片整图执行 OCR，把 rec_texts/rec_scores/rec_boxes 缓存为 JSON-lines（需要 PaddleOCR）
+    """
+    from yolo_ocr import collect_images, load_ocr, ocr_result_to_record
+
+    ocr = load_ocr()
+    images = collect_images(image_dir)
+    with open(cache_path, "w", encoding="utf-8") as f:
+        for image_path in images:
+            for res in ocr.predict(input=image_path):
+                record = {"path": image_path}
+                record.update(ocr_result_to_record(res))
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    print(f"已缓存 {len(images)} 张图片的OCR结果到 {cache_path}")
+
+
+def bench_e2e(reference, image_dir=SINGLE_TICKET_DIR, model_path=r'best.pt', batch_size=8, preprocessor=None,
+              models=None, cascade=None):
+    """
+    端到端运行 YOLO→OCR→解析（需要模型），每张图片取第一个检测结果参与评分：
+    返回 (逐字段得分, images/sec)；preprocessor 不为空时先按其配置降分辨率解码，models 为已加载的 (yolo, ocr)，
+    cascade 不为空时级联识别
+    """
+    from yolo_ocr import collect_images, load_models, recognize_tickets
+
+    yolo_model, ocr = models or load_models(model_path)
+    images = collect_images(image_dir)
+    predictions = {}
+    start = time.perf_counter()
+    for begin in range(0, len(images), batch_size):
+        batch = images[begin:begin + batch_size]
+        prepared = [preprocessor.load(image_path) for image_path in batch] if preprocessor is not None else None
+        source = [image.detect_img for image in prepared] if prepared else batch
+        yolo_results = yolo_model.predict(source=source, save=False, show=False, verbose=False)
+        for k, (image_path, result) in enumerate(zip(batch, yolo_results)):
+            tickets = recognize_tickets(result, ocr, prepared=prepared[k] if prepared else None, cascade=cascade)
+            predictions[os.path.basename(image_path)] = tickets[0] if tickets else {}
+    elapsed = time.perf_counter() - start
+    return score(predictions, reference), len(images) / elapsed
+
+
+def bench_startup(paths, texts, model_path=r'best.pt', image=None, repeat=5):
+    """
+    在全新的 Python 进程中分别测量各路径的导入耗时、首次调用耗时和进程总耗时（取中位数），
+    并记录导入后已加载的重量级视觉依赖（解析路径应为空）
+    """
+    from stage_timer import percentile
+
+    argument = json.dumps([texts, model_path, image], ensure_ascii=False)
+    results = {}
+    for name in paths:
+        import_code, call_code = STARTUP_PATHS[name]
+        script = STARTUP_SCRIPT.format(import_code=import_code, call_code=call_code)
+        runs = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            completed = subprocess.run([sys.executable, "-c", script, argument], capture_output=True, text=True,
+                                       cwd=os.path.dirname(os.path.abspath(__file__)))
+            wall = time.perf_counter() - start
+            if completed.returncode != 0:
+                error = (completed.stderr.strip().splitlines() or ["unknown error"])[-1]
+                runs = None
+                results[name] = {"error": error}
+                break
+            run = json.loads(completed.stdout.strip().splitlines()[-1])
+            run["wall"] = wall
+            runs.append(run)
+        if runs:
+            results[name] = {key: percentile([run[key] for run in runs], 50) for key in ("import", "first_call", "wall")}
+            results[name]["heavy"] = runs[-1]["heavy"]
+    return results
+
+
+def format_startup(results):
+    lines = [f"{'path':<18}{'import':>10}{'first call':>12}{'process':>10}  heavy modules", "-" * 66]
+    for name, row in results.items():
+        if "error" in row:
+            lines.append(f"{name:<18}  失败: {row['error']}")
+            continue
+        lines.append(f"{name:<18}{row['import'] * 1000:>8.1f}ms{row['first_call'] * 1000:>10.1f}ms"
+                     f"{row['wall'] * 1000:>8.1f}ms  {', '.join(row['heavy']) or '-'}")
+    return "\n".join(lines)
+
+
+def bench_preprocess(reference, settings, image_dir=SINGLE_TICKET_DIR, model_path=r'best.pt', batch_size=8):
+    """
+    对每组 (detect_scale, crop_scale, crop_height) 运行端到端评测（模型只加载一次），
+    settings 中的 None 表示不做预处理（原始全分辨率流程）：返回 [(描述, 逐字段得分, images/sec)]
+    """
+    from yolo_ocr import load_models
+
+    models = load_models(model_path)
+    rows = []
+    for setting in settings:
+        preprocessor = Preprocessor(*setting) if setting else None
+        scores, throughput = bench_e2e(reference, image_dir, model_path, batch_size, preprocessor, models)
+        rows.append((preprocessor.describe() if preprocessor else "full resolution", scores, throughput))
+    return rows
+
+
+def bench_cascade(reference, image_dir=SINGLE_TICKET_DIR, model_path=r'best.pt', batch_size=8,
+                  min_confidence=DEFAULT_MIN_CONFIDENCE, fast_crop_height=DEFAULT_FAST_CROP_HEIGHT):
+    """
+    端到端对比完整 OCR 配置与级联识别：返回 (完整配置得分, images/sec, 级联得分, images/sec, OCRCascade)
+    """
+    from yolo_ocr import load_models, load_ocr
+
+    models = load_models(model_path)
+    heavy_scores, heavy_throughput = bench_e2e(reference, image_dir, model_path, batch_size, models=models)
+    cascade = OCRCascade(load_ocr(**FAST_OCR_OVERRIDES), min_confidence, fast_crop_height)
+    cascade_scores, cascade_throughput = bench_e2e(reference, image_dir, model_path, batch_size, models=models,
+                                                   cascade=cascade)
+    return heavy_scores, heavy_throughput, cascade_scores, cascade_throughput, cascade
+
+
+def bench_dedupe(reference, image_dir=SINGLE_TICKET_DIR, distances=(4, 8, DEFAULT_MAX_DISTANCE, 16, 24),
+                 hash_size=DEFAULT_HASH_SIZE):
+    """
+    在单票图片上校准感知哈希阈值（需要 cv2）：参考结果中去重键相同的两张图片视为同一张车票。
+    返回 (每张图片哈希耗时毫秒, 同票图片对数, [(距离阈值, 命中的同票图片对, 误判的异票图片对)])
+    """
+    from preprocess import decode_image
+    from yolo_ocr import collect_images
+
+    images = [path for path in collect_images(image_dir) if os.path.basename(path) in reference]
+    hashes = []
+    hash_seconds = 0.0
+    for path in images:
+        img = decode_image(path)
+        start = time.perf_counter()
+        hashes.append(dhash(img, hash_size))
+        hash_seconds += time.perf_counter() - start
+    keys = [ticket_key(reference[os.path.basename(path)] or {}) for path in images]
+
+    pairs = []  # [(距离, 是否同一张车票)]
+    for a in range(len(images)):
+        for b in range(a + 1, len(images)):
+            pairs.append((hamming(hashes[a], hashes[b]), keys[a] is not None and keys[a] == keys[b]))
+    same = sum(1 for _, is_same in pairs if is_same)
+    rows = [(distance, sum(1 for d, is_same in pairs if d <= distance and is_same),
+             sum(1 for d, is_same in pairs if d <= distance and not is_same)) for distance in distances]
+    return hash_seconds * 1000 / max(len(images), 1), same, rows
+
+
+def format_dedupe(rows, same):
+    lines = [f"{'distance':>9}{'same found':>12}{'recall':>9}{'false pairs':>13}", "-" * 43]
+    for distance, found, false in rows:
+        lines.append(f"{distance:>9}{found:>12}{found / max(same, 1):>9.2%}{false:>13}")
+    return "\n".join(lines)
+
+
+def bench_stations(reference, path=STATIONS_PATH):
+    """
+    运行车站名录回归用例，返回 [(名录, 文本, 置信度低, 期望站名, 实际站名)]；
+    HELD_OUT_STATION_CASES 在留出参考结果站名的名录上运行
+    """
+    rows = []
+    for label, index, cases in (("full", StationIndex.load(path), STATION_CASES),
+                                ("held-out", StationIndex.load(path, exclude=reference_stations(reference)),
+                                 HELD_OUT_STATION_CASES)):
+        for text, uncertain, expected in cases:
+            rows.append((label, text, uncertain, expected, index.resolve(text, "", uncertain)[0]))
+    return rows
+
+
+def format_stations(rows):
+    lines = [f"{'gazetteer':<10}{'text':<8}{'uncertain':>10}  {'expected':<10}{'got':<10}{'':>6}", "-" * 54]
+    for label, text, uncertain, expected, got in rows:
+        lines.append(f"{label:<10}{text:<8}{str(uncertain):>10}  {expected:<10}{got:<10}"
+                     f"{'ok' if got == expected else 'FAIL':>6}")
+    return "\n".join(lines)
+
+
+def build_archive(image_dir, count, directory):
+    """
+    循环复用 image_dir 中的图片，在 directory 中建立 count 张图片的归档（优先硬链接，不支持时复制）
+    """
+    from yolo_ocr import collect_images
+
+    images = collect_images(image_dir)
+    if not images:
+        raise ValueError(f"没有找到图片: {image_dir}")
+    for n in range(count):
+        source = images[n % len(images)]
+        target = os.path.join(directory, f"{n:06d}_{os.path.basename(source)}")
+        try:
+            os.link(source, target)
+        except OSError:
+            shutil.copyfile(source, target)
+    return directory
+
+
+class _StubTensor:
+    def __init__(self, values):
+        self._values = values
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self._values
+
+
+class _StubBox:
+    def __init__(self, xyxy):
+        import numpy as np
+
+        self.xyxy = [_StubTensor(np.array(xyxy, dtype=float))]
+
+
+class StubResult:
+    """
+    与 ultralytics Results 接口相同的检测结果：整图填满像素（确保内存真正分配），含两个检测框
+    """
+
+    def __init__(self, path, shape):
+        import numpy as np
+
+        self.path = path
+        self.orig_img = np.full(shape, 255, dtype=np.uint8)
+        height, width = shape[:2]
+        self.boxes = [_StubBox([width // 8, height // 8, width // 2, height // 2]),
+                      _StubBox([width // 2, height // 2, width * 7 // 8, height * 7 // 8])]
+        self.speed = {}
+
+
+class StubDetector:
+    """
+    不加载模型的检测器：predict 不读取图片文件，逐张产出 shape 大小整图的 StubResult
+    """
+
+    def __init__(self, shape=STUB_IMAGE_SHAPE):
+        self.shape = tuple(shape)
+
+    def predict(self, source, stream=False, **kwargs):
+        results = (StubResult(path, self.shape) for path in source)
+        return results if stream else list(results)
+
+
+class StubOCR:
+    """
+    不加载模型的OCR：每个输入返回固定的车票文本
+    """
+
+    def predict(self, input):
+        inputs = input if isinstance(input, list) else [input]
+        return [{"rec_texts": SAMPLE_TEXTS, "rec_scores": [1.0] * len(SAMPLE_TEXTS), "rec_boxes": []}
+                for _ in inputs]
+
+
+def build_stub_archive(count, directory):
+    """
+    在 directory 中建立 count 个空图片文件（桩检测器不读取文件内容）
+    """
+    os.makedirs(directory, exist_ok=True)
+    for n in range(count):
+        open(os.path.join(directory, f"{n:06d}.jpg"), "wb").close()
+    return directory
+
+
+def bench_memory(sizes, image_dir=ARCHIVE_DIR, model_path=r'best.pt', batch_size=8, stub=False):
+    """
+    对每个归档大小在新进程中运行批处理流水线，返回 [(图片数, 峰值常驻内存MB, images/sec)]；
+    流水线的内存应与归档大小无关。stub 为 True 时用桩检测器和桩OCR运行，不需要模型和图片
+    """
+    rows = []
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            output_dir = os.path.join(tmp, "output")
+            if stub:
+                archive = build_stub_archive(size, os.path.join(tmp, "archive"))
+                script, args = STUB_MEMORY_SCRIPT, [archive, output_dir, batch_size, STUB_IMAGE_SHAPE]
+            else:
+                archive = build_archive(image_dir, size, os.path.join(tmp, "archive"))
+                script, args = MEMORY_SCRIPT, [archive, model_path, output_dir, batch_size]
+            output = subprocess.run([sys.executable, "-c", script, json.dumps(args)], check=True,
+                                    capture_output=True, text=True).stdout
+        data = json.loads(output.strip().splitlines()[-1])
+        rows.append((size, data["peak_rss_mb"], data["images"] / data["elapsed"] if data["elapsed"] else 0.0))
+    return rows
+
+
+def format_memory(rows):
+    lines = [f"{'images':>8}{'peak RSS(MB)':>14}{'images/sec':>12}", "-" * 34]
+    for size, peak, throughput in rows:
+        lines.append(f"{size:>8}{peak:>14.0f}{throughput:>12.2f}")
+    return "\n".join(lines)
+
+
+def format_preprocess(rows):
+    lines = [f"{'setting':<40}{'images/sec':>12}{'fields':>9}{'tickets':>9}", "-" * 70]
+    for name, scores, throughput in rows:
+        lines.append(f"{name:<40}{throughput:>12.2f}{scores['_all']['accuracy']:>9.2%}"
+                     f"{scores['_tickets']['accuracy']:>9.2%}")
+    return "\n".join(lines)
+
+
+def report(title, scores, throughput, unit, args):
+    """
+    输出得分表和吞吐量，并保存或检查该模式的准确率基线；有字段退化时返回 1
+    """
+    print(f"\n== {title} ==")
+    print(format_scores(scores))
+    print(f"\n吞吐量: {throughput:.1f} {unit}")
+
+    if args.save_baseline:
+        save_baseline(scores, args.command, args.baseline)
+        print(f"准确率基线已保存到 {args.baseline}")
+    elif args.command in load_baseline(args.baseline):
+        regressions = check_baseline(scores, args.command, args.baseline, args.tolerance)
+        for field, expected, current in regressions:
+            print(f"准确率下降: {field} {expected:.2%} → {current:.2%}")
+        if regressions:
+            return 1
+        print(f"准确率不低于基线 {args.baseline}")
+    return 0
+
+
+def main(argv=None):
+    # 基线相关参数对各评测子命令通用
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--reference", default=REFERENCE_PATH, help="参考抽取结果")
+    common.add_argument("--baseline", default=BASELINE_PATH, help="准确率基线文件")
+    common.add_argument("--save-baseline", action="store_true", help="把本次准确率保存为基线")
+    common.add_argument("--tolerance", type=float, default=0.0, help="允许的准确率下降幅度")
+
+    parser = argparse.ArgumentParser(description="车票解析准确率与速度基准")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    cache_parser = subparsers.add_parser("build-cache", help="对单票图片执行OCR并缓存文本")
+    cache_parser.add_argument("--images", default=SINGLE_TICKET_DIR)
+    cache_parser.add_argument("--cache", default=OCR_CACHE_PATH)
+
+    parse_parser = subparsers.add_parser("parser", parents=[common], help="在缓存的OCR文本上评测解析器")
+    parse_parser.add_argument("--cache", default=OCR_CACHE_PATH)
+    parse_parser.add_argument("--repeat", type=int, default=20, help="计时重复次数")
+    parse_parser.add_argument("--stations", nargs="?", const=STATIONS_PATH,
+                              help="同时评测启用车站名录的解析（不带路径时使用 data/stations.txt；参考结果中的站名从名录中留出）")
+    parse_parser.add_argument("--train-index", help="建立车次途经站索引的历史抽取结果（不要与 --reference 相同，避免泄漏）")
+    parse_parser.add_argument("--strict-stations", action="store_true", help="丢弃名录外的站名")
+
+    e2e_parser = subparsers.add_parser("e2e", parents=[common], help="端到端评测 YOLO→OCR→解析")
+    e2e_parser.add_argument("--images", default=SINGLE_TICKET_DIR)
+    e2e_parser.add_argument("--model", default=r'best.pt')
+    e2e_parser.add_argument("--batch-size", type=int, default=8)
+
+    layout_parser = subparsers.add_parser("layout", parents=[common], help="对比版面解析与按文本顺序解析")
+    layout_parser.add_argument("--cache", default=OCR_CACHE_PATH)
+    layout_parser.add_argument("--repeat", type=int, default=20, help="计时重复次数")
+
+    preprocess_parser = subparsers.add_parser("preprocess", parents=[common],
+                                              help="端到端对比不同解码/裁剪分辨率的速度与准确率")
+    preprocess_parser.add_argument("--images", default=SINGLE_TICKET_DIR)
+    preprocess_parser.add_argument("--model", default=r'best.pt')
+    preprocess_parser.add_argument("--batch-size", type=int, default=8)
+    preprocess_parser.add_argument("--detect-scales", type=int, nargs="+", default=[1, 2, 4], choices=REDUCED_SCALES)
+    preprocess_parser.add_argument("--crop-scales", type=int, nargs="+", default=[1, 2], choices=REDUCED_SCALES)
+    preprocess_parser.add_argument("--crop-heights", type=int, nargs="+", default=[0, DEFAULT_CROP_HEIGHT, 480],
+                                   help="裁剪图目标高度，0 表示不缩放")
+
+    cascade_parser = subparsers.add_parser("cascade", parents=[common], help="端到端对比完整OCR与级联识别")
+    cascade_parser.add_argument("--images", default=SINGLE_TICKET_DIR)
+    cascade_parser.add_argument("--model", default=r'best.pt')
+    cascade_parser.add_argument("--batch-size", type=int, default=8)
+    cascade_parser.add_argument("--min-confidence", type=float, default=DEFAULT_MIN_CONFIDENCE)
+    cascade_parser.add_argument("--fast-crop-height", type=int, default=DEFAULT_FAST_CROP_HEIGHT)
+
+    dedupe_parser = subparsers.add_parser("dedupe", help="校准近重复裁剪图的感知哈希距离阈值")
+    dedupe_parser.add_argument("--reference", default=REFERENCE_PATH, help="参考抽取结果")
+    dedupe_parser.add_argument("--images", default=SINGLE_TICKET_DIR)
+    dedupe_parser.add_argument("--distances", type=int, nargs="+", default=[4, 8, DEFAULT_MAX_DISTANCE, 16, 24])
+
+    stations_parser = subparsers.add_parser("stations", help="车站名录纠错回归用例（名录外的真实站名不得改写）")
+    stations_parser.add_argument("--reference", default=REFERENCE_PATH, help="参考抽取结果（留出其中的站名）")
+    stations_parser.add_argument("--stations", default=STATIONS_PATH, help="车站名录")
+
+    memory_parser = subparsers.add_parser("memory", help="峰值内存回归检查：归档变大时峰值内存不应增长")
+    memory_parser.add_argument("--images", default=ARCHIVE_DIR, help="循环复用这些图片组成归档")
+    memory_parser.add_argument("--sizes", type=int, nargs="+", default=[20, 200], help="归档图片数")
+    memory_parser.add_argument("--model", default=r'best.pt')
+    memory_parser.add_argument("--batch-size", type=int, default=8)
+    memory_parser.add_argument("--stub", action="store_true",
+                               help="不加载模型：桩检测器逐张产出约 9 MB 的整图，桩OCR返回固定文本，只检查流水线本身")
+    memory_parser.add_argument("--max-growth-mb", type=float, default=100.0,
+                               help="最大归档相对最小归档允许的峰值内存增长（MB），超过时退出码为 1")
+
+    startup_parser = subparsers.add_parser("startup", help="冷启动评测：导入耗时与首次调用耗时")
+    startup_parser.add_argument("--paths", nargs="+", choices=sorted(STARTUP_PATHS), default=sorted(STARTUP_PATHS))
+    startup_parser.add_argument("--cache", default=OCR_CACHE_PATH, help="取第一条OCR文本作为解析输入")
+    startup_parser.add_argument("--images", default=SINGLE_TICKET_DIR, help="pipeline 路径使用其中第一张图片")
+    startup_parser.add_argument("--model", default=r'best.pt')
+    startup_parser.add_argument("--repeat", type=int, default=5)
+
+    args = parser.parse_args(argv)
+
+    if args.command == "build-cache":
+        build_ocr_cache(args.images, args.cache)
+        return 0
+    if args.command == "startup":
+        texts = read_ocr_records(args.cache)[0]["rec_texts"] if os.path.exists(args.cache) else SAMPLE_TEXTS
+        from yolo_ocr import collect_images
+        images = collect_images(args.images) if os.path.exists(args.images) else []
+        results = bench_startup(args.paths, texts, args.model, images[0] if images else None, args.repeat)
+        print(format_startup(results))
+        return 0
+
+    if args.command == "memory":
+        rows = bench_memory(sorted(args.sizes), args.images, args.model, args.batch_size, args.stub)
+        print(format_memory(rows))
+        growth = rows[-1][1] - rows[0][1]
+        print(f"\n峰值内存增长 {growth:.0f} MB（上限 {args.max_growth_mb:.0f} MB）")
+        return 1 if growth > args.max_growth_mb else 0
+
+    reference = load_reference(args.reference)
+    if args.command == "parser":
+        records = read_ocr_records(args.cache)
+        scores, throughput = bench_parser(records, reference, args.repeat)
+        if not args.stations:
+            return report("解析器（缓存OCR文本）", scores, throughput, "tickets/sec", args)
+        start = time.perf_counter()
+        held_out = reference_stations(reference)
+        station_index = StationIndex.load(args.stations, args.train_index, strict=args.strict_stations,
+                                          exclude=held_out)
+        load_ms = (time.perf_counter() - start) * 1000
+        station_scores, station_throughput = bench_parser(records, reference, args.repeat, station_index)
+        print("\n== 干扰词过滤 vs 车站名录 ==")
+        print(format_comparison(scores, station_scores, ("blacklist", "gazetteer")))
+        print(f"\n名录加载 {load_ms:.1f}ms（{len(station_index.trie)} 个站名，留出参考结果中的 {len(held_out)} 个）；"
+              f"干扰词过滤: {throughput:.1f} tickets/sec，车站名录: {station_throughput:.1f} tickets/sec")
+        # 启用名录时单独保存/检查基线
+        args.command = "parser-stations"
+        return report("解析器 + 车站名录（缓存OCR文本）", station_scores, station_throughput, "tickets/sec", args)
+    if args.command == "layout":
+        results = bench_layout(read_ocr_records(args.cache), reference, args.repeat)
+        (order_scores, order_throughput), (layout_scores, layout_throughput) = results["order"], results["layout"]
+        print("\n== 按文本顺序 vs 版面解析 ==")
+        print(format_comparison(order_scores, layout_scores))
+        print(f"\n按文本顺序: {order_throughput:.1f} tickets/sec，版面解析: {layout_throughput:.1f} tickets/sec")
+        return report("版面解析（缓存OCR文本）", layout_scores, layout_throughput, "tickets/sec", args)
+    if args.command == "preprocess":
+        settings = [None] + [(detect, crop, height) for detect in args.detect_scales for crop in args.crop_scales
+                             for height in args.crop_heights if crop <= detect]
+        rows = bench_preprocess(reference, settings, args.images, args.model, args.batch_size)
+        print(format_preprocess(rows))
+        # 基线只对默认预处理配置检查
+        default = f"detect 1/{DEFAULT_DETECT_SCALE}, crop 1/{DEFAULT_CROP_SCALE}, height {DEFAULT_CROP_HEIGHT}"
+        for name, scores, throughput in rows:
+            if name == default:
+                return report(f"预处理（{name}）", scores, throughput, "images/sec", args)
+        return 0
+    if args.command == "cascade":
+        heavy_scores, heavy_throughput, scores, throughput, cascade = bench_cascade(
+            reference, args.images, args.model, args.batch_size, args.min_confidence, args.fast_crop_height)
+        print("\n== 完整配置 vs 级联识别 ==")
+        print(format_comparison(heavy_scores, scores, ("full", "cascade")))
+        print(f"\n完整配置: {heavy_throughput:.2f} images/sec，级联识别: {throughput:.2f} images/sec，"
+              f"升级比例 {cascade.escalation_rate:.1%}（{cascade.escalated}/{cascade.tickets}）")
+        return report("级联识别", scores, throughput, "images/sec", args)
+    if args.command == "dedupe":
+        hash_ms, same, rows = bench_dedupe(reference, args.images, args.distances)
+        print(f"\n== 感知哈希阈值（{DEFAULT_HASH_SIZE * DEFAULT_HASH_SIZE} 位 dHash）==")
+        print(format_dedupe(rows, same))
+        print(f"\n同一张车票的图片对: {same}，哈希耗时 {hash_ms:.2f}ms/图")
+        # 误判会让不同车票共用OCR结果，默认阈值下出现误判时以退出码 1 提示
+        return 1 if any(false for distance, _, false in rows if distance == DEFAULT_MAX_DISTANCE) else 0
+    if args.command == "stations":
+        rows = bench_stations(reference, args.stations)
+        print(format_stations(rows))
+        failed = sum(1 for *_, expected, got in rows if got != expected)
+        print(f"\n{len(rows)} 个用例，{failed} 个失败")
+        return 1 if failed else 0
+    scores, throughput = bench_e2e(reference, args.images, args.model, args.batch_size)
+    return report("端到端", scores, throughput, "images/sec", args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,315 @@
+import os
+import sys
+import csv
+import json
+import time
+import logging
+import argparse
+import multiprocessing
+from collections import deque
+from ticket_parser import TICKET_FIELDS, clean_texts, parse_ticket_info
+from pipeline_log import setup_logging
+from station_index import STATIONS_PATH, low_confidence_texts
+
+logger = logging.getLogger(__name__)
+
+# 每个任务解析的记录数：足够大以摊薄进程间传输开销，又不至于让单个任务占用过多内存
+DEFAULT_CHUNK_SIZE = 2000
+# 每个 worker 最多同时排队的任务数（限制主进程读入但尚未解析的数据量）
+TASKS_PER_WORKER = 2
+
+# worker 进程内的解析配置（每个进程初始化一次）
+_worker = {}
+
+
+def _init_worker(column, id_column, layout, stations, train_index):
+    _worker.update(column=column, id_column=id_column, layout=layout, station_index=None)
+    if stations:
+        from station_index import StationIndex
+        _worker["station_index"] = StationIndex.load(stations, train_index)
+
+
+def _parse_rows(rows):
+    """
+    worker 中执行：解析一组记录，返回列式结果 {字段: [值]}（含 id 列和 error 列）。
+    记录可以是 JSONL 原始行（在 worker 中解码，主进程只负责读文件）、{column: [...]} 字典或文本列表
+    """
+    column, id_column = _worker["column"], _worker["id_column"]
+    columns = {field: [] for field in TICKET_FIELDS}
+    ids = []
+    errors = []
+    if _worker["layout"]:
+        from layout_parser import parse_ticket_layout
+    for row in rows:
+        error = ""
+        if isinstance(row, str):
+            try:
+                row = json.loads(row)
+            except json.JSONDecodeError as e:
+                row, error = {}, f"invalid json: {e}"
+        if isinstance(row, dict):
+            record = row
+            texts = row.get(column) or []
+        else:
+            record = {column: row}
+            texts = row or []
+        try:
+            if _worker["layout"]:
+                ticket_info = parse_ticket_layout(dict(record, rec_texts=texts), _worker["station_index"])
+            else:
+                station_index = _worker["station_index"]
+                uncertain_texts = () if station_index is None else low_confidence_texts(dict(record, rec_texts=texts))
+                ticket_info = parse_ticket_info(clean_texts(texts), station_index, uncertain_texts)
+        except Exception as e:
+            # 单条坏数据（如文本不是字符串）不影响整批
+            ticket_info, error = {}, error or f"{type(e).__name__}: {e}"
+        for field in TICKET_FIELDS:
+            columns[field].append(ticket_info.get(field, ""))
+        ids.append(record.get(id_column) if id_column else None)
+        errors.append(error)
+    if id_column:
+        columns[id_column] = ids
+    columns["error"] = errors
+    return columns
+
+
+def read_rows(path, column="rec_texts", id_column=None, chunk_size=DEFAULT_CHUNK_SIZE, layout=False, scores=False):
+    """
+    按 chunk_size 条一组读取记录：.parquet 用 pyarrow 按批读取 column（和 id_column）列，
+    layout 为 True 时另读 rec_boxes 列（版面解析需要文本框坐标），scores 为 True 时另读 rec_scores 列
+    （车站名录按 OCR 置信度决定是否纠错）；其他文件视为 JSONL，逐行原样交给 worker 解码
+    """
+    if path.endswith(".parquet"):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise ImportError("读取 Parquet 需要先安装 pyarrow") from e
+        parquet = pq.ParquetFile(path)
+        columns = [column] + ([id_column] if id_column else [])
+        if layout:
+            if "rec_boxes" in parquet.schema_arrow.names:
+                columns.append("rec_boxes")
+            else:
+                logger.warning("%s 中没有 rec_boxes 列，版面解析将退回按文本顺序解析", path)
+        if scores and "rec_scores" in parquet.schema_arrow.names:
+            columns.append("rec_scores")
+        for batch in parquet.iter_batches(batch_size=max(chunk_size, 1), columns=columns):
+            yield batch.to_pylist()
+        return
+
+    chunk = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            chunk.append(line)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
+
+
+def _merge(columns, part):
+    for name, values in part.items():
+        columns.setdefault(name, []).extend(values)
+
+
+def parse_chunks(chunks, workers=None, column="rec_texts", id_column=None, layout=False, stations=None,
+                 train_index=None):
+    """
+    在进程池中批量解析：chunks 为记录分组的可迭代对象（如 read_rows 的输出），
+    按输入顺序逐组产出列式结果 {字段: [值]}（另含 error 列，id_column 不为空时含该列）。
+    workers 默认为 CPU 核数，为 1 时在当前进程内解析；同时在途的分组数有上限，
+    调用方逐组写出时内存占用与输入总量无关
+    """
+    workers = workers or os.cpu_count() or 1
+    initargs = (column, id_column, layout, stations, train_index)
+    if workers == 1:
+        _init_worker(*initargs)
+        for chunk in chunks:
+            yield _parse_rows(chunk)
+        return
+
+    pool = multiprocessing.Pool(workers, initializer=_init_worker, initargs=initargs)
+    try:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.apply_async(_parse_rows, (chunk,)))
+            if len(pending) >= workers * TASKS_PER_WORKER:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def parse_many(chunks, workers=None, column="rec_texts", id_column=None, layout=False, stations=None,
+               train_index=None):
+    """
+    parse_chunks 的结果合并为一份列式结果（全部保存在内存中，适合交给 to_dataframe 的小规模输入）
+    """
+    columns = {}
+    for part in parse_chunks(chunks, workers, column, id_column, layout, stations, train_index):
+        _merge(columns, part)
+    return columns
+
+
+class FillCounter:
+    """
+    逐组累计每个车票字段的非空条数和出错条数，不保留字段值
+    """
+
+    def __init__(self):
+        self.total = 0
+        self.errors = 0
+        self.filled = {field: 0 for field in TICKET_FIELDS}
+
+    def update(self, columns):
+        self.total += len(columns.get("error", ()))
+        self.errors += sum(1 for error in columns.get("error", ()) if error)
+        for field in TICKET_FIELDS:
+            self.filled[field] += sum(1 for value in columns.get(field, ()) if value)
+
+    def rates(self):
+        return {field: filled / self.total if self.total else 0.0 for field, filled in self.filled.items()}
+
+
+def fill_rates(columns):
+    """
+    每个车票字段非空的比例：{字段: 比例}
+    """
+    counter = FillCounter()
+    counter.update(columns)
+    return counter.rates()
+
+
+def format_fill_rates(rates, total):
+    lines = [f"{'field':<20}{'fill rate':>10}{'filled':>10}", "-" * 40]
+    for field, rate in rates.items():
+        lines.append(f"{field:<20}{rate:>10.2%}{round(rate * total):>10}")
+    return "\n".join(lines)
+
+
+def to_dataframe(columns):
+    """
+    把列式结果转为 pandas.DataFrame（需要 pandas）
+    """
+    try:
+        import pandas as pd
+    except ImportError as e:
+        raise ImportError("转为 DataFrame 需要先安装 pandas") from e
+    return pd.DataFrame(columns)
+
+
+class ColumnWriter:
+    """
+    按扩展名逐组追加写出列式结果：.parquet（需要 pyarrow，每组写为一个 row group，表结构取自第一组）、
+    .csv（首组前写表头），其他视为 JSONL（每行一条记录）
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.rows = 0
+        self._parquet = None
+        self._file = None
+        self._csv = None
+        if path.endswith(".parquet"):
+            try:
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+            except ImportError as e:
+                raise ImportError("写出 Parquet 需要先安装 pyarrow") from e
+            self._pa, self._pq = pa, pq
+        else:
+            self._file = open(path, "w", encoding="utf-8", newline="")
+            if path.endswith(".csv"):
+                self._csv = csv.writer(self._file)
+
+    def write(self, columns):
+        names = list(columns)
+        if self._file is None:
+            if self._parquet is None:
+                table = self._pa.table(columns)
+                self._parquet = self._pq.ParquetWriter(self.path, table.schema)
+            else:
+                table = self._pa.table(columns, schema=self._parquet.schema)
+            self._parquet.write_table(table)
+        else:
+            rows = zip(*(columns[name] for name in names))
+            if self._csv is not None:
+                if not self.rows:
+                    self._csv.writerow(names)
+                self._csv.writerows(rows)
+            else:
+                for row in rows:
+                    self._file.write(json.dumps(dict(zip(names, row)), ensure_ascii=False) + "\n")
+        self.rows += len(columns.get("error", ()))
+
+    def close(self):
+        if self._parquet is not None:
+            self._parquet.close()
+            self._parquet = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def write_columns(columns, path):
+    """
+    一次写出完整的列式结果（格式同 ColumnWriter）
+    """
+    with ColumnWriter(path) as writer:
+        writer.write(columns)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="批量重新解析已保存的OCR文本（多进程，列式输出）")
+    parser.add_argument("input", help="JSONL（每行含文本列表列，或直接是文本列表）或 Parquet 文件")
+    parser.add_argument("--column", default="rec_texts", help="文本列表所在的列")
+    parser.add_argument("--id-column", help="原样带到输出中的标识列（如 path）")
+    parser.add_argument("--output", help="解析结果输出文件（.parquet / .csv / .jsonl）")
+    parser.add_argument("--workers", type=int, default=None, help="进程数，默认 CPU 核数")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="每个任务解析的记录数")
+    parser.add_argument("--layout", action="store_true", help="使用版面解析（需要记录中有 rec_boxes）")
+    parser.add_argument("--stations", nargs="?", const=STATIONS_PATH,
+                        help="用车站名录校验和纠正站名（不带路径时使用 data/stations.txt，可与 --layout 同时使用）")
+    parser.add_argument("--train-index", help="历史抽取结果 JSON，用于建立车次途经站索引（配合 --stations）")
+    parser.add_argument("-v", "--verbose", action="count", default=0)
+    args = parser.parse_args(argv)
+    setup_logging(args.verbose)
+
+    start = time.perf_counter()
+    counter = FillCounter()
+    writer = ColumnWriter(args.output) if args.output else None
+    try:
+        # 每组解析结果立即写出并计入填充率，不在内存中累积整个归档
+        rows = read_rows(args.input, args.column, args.id_column, args.chunk_size, args.layout, bool(args.stations))
+        for columns in parse_chunks(rows, args.workers, args.column, args.id_column, args.layout, args.stations,
+                                    args.train_index):
+            counter.update(columns)
+            if writer is not None:
+                writer.write(columns)
+    finally:
+        if writer is not None:
+            writer.close()
+    elapsed = time.perf_counter() - start
+
+    total = counter.total
+    print(format_fill_rates(counter.rates(), total))
+    print(f"\n共解析 {total} 条（{counter.errors} 条出错），耗时 {elapsed:.2f}s，"
+          f"{total / elapsed if elapsed else 0:.0f} tickets/sec")
+    if args.output:
+        print(f"解析结果已写入 {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
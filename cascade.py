@@ -0,0 +1,83 @@
+import logging
+from ticket_parser import TICKET_FIELDS
+
+logger = logging.getLogger(__name__)
+
+# 级联识别中必须以高置信度识别出的字段，缺任意一个就升级到重型 OCR 配置
+REQUIRED_FIELDS = ("train_code", "departure_station", "arrival_station", "datetime", "price")
+DEFAULT_MIN_CONFIDENCE = 0.9
+# 快速配置：PP-OCRv5 移动端检测/识别模型 + 缩小后的裁剪图
+FAST_OCR_OVERRIDES = {
+    "text_detection_model_name": "PP-OCRv5_mobile_det",
+    "text_recognition_model_name": "PP-OCRv5_mobile_rec",
+}
+DEFAULT_FAST_CROP_HEIGHT = 480
+
+
+def _value_score(value, blocks):
+    """
+    在 [(文本, 置信度)] 中定位字段值的来源文本块并返回其置信度：
+    单个文本块包含该值 → 该块置信度；相邻两块拼接后包含 → 两块中较低的置信度；
+    数字序列匹配（如全角冒号的时间）→ 该块置信度；找不到来源（如经过名录纠正的站名）→ 0
+    """
+    for text, score in blocks:
+        if value in text:
+            return score
+    for (text, score), (next_text, next_score) in zip(blocks, blocks[1:]):
+        if value in text + next_text:
+            return min(score, next_score)
+    digits = "".join(ch for ch in value if ch.isdigit())
+    if len(digits) >= 4:
+        for text, score in blocks:
+            if digits in "".join(ch for ch in text if ch.isdigit()):
+                return score
+    return 0.0
+
+
+def field_confidence(ticket_info, record):
+    """
+    按 OCR 记录的 rec_scores 计算每个已识别字段的置信度，返回 {field: score}（空字段不输出）
+    """
+    scores = record.get("rec_scores") or [1.0] * len(record.get("rec_texts", []))
+    blocks = [(text.replace(" ", ""), float(score)) for text, score in zip(record.get("rec_texts", []), scores)
+              if text.strip()]
+    confidence = {}
+    for field in TICKET_FIELDS:
+        value = ticket_info.get(field)
+        if value:
+            confidence[field] = round(_value_score(str(value).replace(" ", ""), blocks), 4)
+    return confidence
+
+
+class OCRCascade:
+    """
+    级联 OCR：先用快速配置 fast_ocr 识别缩小后的裁剪图，必填字段都以不低于 min_confidence 的置信度识别出时直接采用，
+    否则把该裁剪图交给流水线原有的（重型）OCR 重新识别；统计升级比例
+    """
+
+    def __init__(self, fast_ocr, min_confidence=DEFAULT_MIN_CONFIDENCE, fast_crop_height=DEFAULT_FAST_CROP_HEIGHT,
+                 required=REQUIRED_FIELDS):
+        self.fast_ocr = fast_ocr
+        self.min_confidence = min_confidence
+        self.fast_crop_height = fast_crop_height
+        self.required = required
+        self.tickets = 0
+        self.escalated = 0
+
+    def should_escalate(self, ticket_info, confidence):
+        """
+        返回需要升级的原因字段列表（缺失或置信度不足），为空表示快速结果可直接采用
+        """
+        return [field for field in self.required
+                if not ticket_info.get(field) or confidence.get(field, 0.0) < self.min_confidence]
+
+    def record(self, tickets, escalated):
+        self.tickets += tickets
+        self.escalated += escalated
+
+    @property
+    def escalation_rate(self):
+        return self.escalated / self.tickets if self.tickets else 0.0
+
+    def summary(self):
+        return {"tickets": self.tickets, "escalated": self.escalated, "escalation_rate": round(self.escalation_rate, 4)}
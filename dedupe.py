@@ -0,0 +1,189 @@
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+# dHash 尺寸：裁剪图缩小为 (N+1)×N 的灰度图，比较横向相邻像素，得到 N×N 位的哈希
+DEFAULT_HASH_SIZE = 16
+# 两个裁剪图的哈希汉明距离不超过该值（256 位中约 5%）视为同一张车票的近重复照片
+DEFAULT_MAX_DISTANCE = 12
+# 宽高比相差超过该比例的裁剪图不视为近重复（避免不同版式的车票偶然哈希相近）
+MAX_ASPECT_DIFF = 0.1
+# 感知哈希索引保留的最大裁剪图数量，超过时丢弃最早的一半
+DEFAULT_MAX_ENTRIES = 10000
+# 重复车票的判定字段；座位号不含数字（如"无座"）时同一车次可能有多张车票，不参与判定
+DEDUPE_FIELDS = ("train_code", "datetime", "carriage", "seat_num")
+
+
+def dhash(img, hash_size=DEFAULT_HASH_SIZE):
+    """
+    计算图片的差异哈希（dHash）：灰度化后缩小到 (hash_size+1)×hash_size，
+    每个像素与右侧像素比较得到一位，返回 hash_size² 位的整数
+    """
+    import cv2
+    import numpy as np
+
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+    small = cv2.resize(gray, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    bits = small[:, 1:] > small[:, :-1]
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+class CropHashIndex:
+    """
+    裁剪图感知哈希索引：按 dHash 查找此前识别过的近重复裁剪图，复用其 OCR 记录。
+    哈希切分为 max_distance+1 段，距离不超过 max_distance 的两个哈希至少有一段完全相同（抽屉原理），
+    因此只需比较与查询哈希有相同分段的条目，查询开销与索引大小基本无关
+    """
+
+    def __init__(self, max_distance=DEFAULT_MAX_DISTANCE, hash_size=DEFAULT_HASH_SIZE,
+                 max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_distance = max_distance
+        self.hash_size = hash_size
+        self.max_entries = max_entries
+        bits = hash_size * hash_size
+        bands = min(max_distance + 1, bits)
+        # [(右移位数, 掩码)]
+        edges = [bits * b // bands for b in range(bands + 1)]
+        self._bands = [(edges[b], (1 << (edges[b + 1] - edges[b])) - 1) for b in range(bands)]
+        self._entries = {}  # 条目编号 → [哈希, 宽高比, OCR 记录, 记录在 OCR 缓存中的键]
+        self._buckets = {}  # (分段序号, 分段值) → [条目编号]
+        self._next_id = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def hash(self, img):
+        return dhash(img, self.hash_size)
+
+    def find(self, crop_hash, shape):
+        """
+        返回与 (crop_hash, 裁剪图尺寸) 最接近且距离不超过 max_distance 的条目编号，没有返回 None
+        """
+        aspect = shape[1] / max(shape[0], 1)
+        best, best_distance = None, self.max_distance + 1
+        seen = set()
+        for b, (shift, mask) in enumerate(self._bands):
+            for entry_id in self._buckets.get((b, (crop_hash >> shift) & mask), ()):
+                if entry_id in seen:
+                    continue
+                seen.add(entry_id)
+                entry_hash, entry_aspect = self._entries[entry_id][:2]
+                if abs(entry_aspect - aspect) > MAX_ASPECT_DIFF * entry_aspect:
+                    continue
+                distance = hamming(crop_hash, entry_hash)
+                if distance < best_distance:
+                    best, best_distance = entry_id, distance
+        return best
+
+    def add(self, crop_hash, shape, record=None, cache_key=None):
+        """
+        登记一张裁剪图，返回条目编号；record（及其在 OCR 缓存中的键）可在 OCR 完成后用 set 补上
+        """
+        if len(self._entries) >= self.max_entries:
+            self._trim()
+        entry_id = self._next_id
+        self._next_id += 1
+        self._entries[entry_id] = [crop_hash, shape[1] / max(shape[0], 1), record, cache_key]
+        for b, (shift, mask) in enumerate(self._bands):
+            self._buckets.setdefault((b, (crop_hash >> shift) & mask), []).append(entry_id)
+        return entry_id
+
+    def set(self, entry_id, record, cache_key=None):
+        if entry_id in self._entries:
+            self._entries[entry_id][2:] = [record, cache_key]
+
+    def record(self, entry_id):
+        return self._entries[entry_id][2]
+
+    def cache_key(self, entry_id):
+        return self._entries[entry_id][3]
+
+    def _trim(self):
+        """
+        丢弃最早登记的一半条目并重建分段索引
+        """
+        keep = sorted(self._entries)[len(self._entries) // 2:]
+        entries = {entry_id: self._entries[entry_id] for entry_id in keep}
+        self._entries = {}
+        self._buckets = {}
+        for entry_id, entry in entries.items():
+            self._entries[entry_id] = entry
+            crop_hash = entry[0]
+            for b, (shift, mask) in enumerate(self._bands):
+                self._buckets.setdefault((b, (crop_hash >> shift) & mask), []).append(entry_id)
+        logger.debug("感知哈希索引已裁剪到 %d 条", len(self._entries))
+
+
+def ticket_key(ticket_info):
+    """
+    车票的去重键 (车次, 发车时间, 车厢, 座位号)；车次、发车时间缺失或座位号不含数字时返回 None
+    """
+    key = tuple((ticket_info.get(field) or "").strip() for field in DEDUPE_FIELDS)
+    train_code, datetime, _, seat_num = key
+    if not train_code or not datetime or not any(ch.isdigit() for ch in seat_num):
+        return None
+    return key
+
+
+class TicketDedupeIndex:
+    """
+    已解析车票的去重索引：同一车次、发车时间、车厢和座位号的车票只有第一次出现的那张视为原件，
+    之后出现的标记 duplicate_of = {"source": 原件图片, "detection_id": 原件检测序号}
+    （用于发现同一张车票被多次上传或重复报销）
+    """
+
+    def __init__(self):
+        self._first = {}
+        self.duplicates = 0
+
+    def __len__(self):
+        return len(self._first)
+
+    def check(self, ticket_info, source):
+        """
+        登记一张车票；已有相同车票时返回原件信息，否则返回 None
+        """
+        key = ticket_key(ticket_info)
+        if key is None:
+            return None
+        first = self._first.get(key)
+        if first is None:
+            self._first[key] = {"source": source, "detection_id": ticket_info.get("detection_id")}
+            return None
+        self.duplicates += 1
+        return first
+
+    def flag(self, source, tickets):
+        """
+        登记一张图片的全部车票，为重复的车票写入 duplicate_of 字段，返回重复的张数
+        """
+        count = 0
+        for ticket_info in tickets:
+            first = self.check(ticket_info, source)
+            if first is not None:
+                ticket_info["duplicate_of"] = first
+                count += 1
+        return count
+
+    def load_jsonl(self, jsonl_path):
+        """
+        从已有的 results.jsonl 登记车票（续跑时跨运行识别重复），不计入 duplicates
+        """
+        duplicates = self.duplicates
+        with open(jsonl_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if record.get("detection_id") is not None:
+                    self.check(record, record["source"])
+        self.duplicates = duplicates
+        logger.debug("去重索引已从 %s 登记 %d 张车票", jsonl_path, len(self._first))
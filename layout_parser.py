@@ -0,0 +1,263 @@
+import logging
+from ticket_parser import (
+    TRAIN_CODE_PATTERN, SEAT_COMBO_PATTERN, SEAT_OCR_PATTERN, CARRIAGE_PATTERN, SEAT_NUM_PATTERN, BERTH_TYPES,
+    PRICE_PATTERN, DECIMAL_PATTERN, SEAT_TYPES, DISCOUNT_TYPES, NAME_ID_PATTERN,
+    NAME_ID_LOOSE_PATTERN, NAME_AFTER_DIGITS_PATTERN, NAME_ONLY_PATTERN, NON_NAME_WORDS, TICKET_FIELDS,
+    clean_texts, find_stations, match_datetime, parse_ticket_info,
+)
+from station_index import low_confidence_texts
+
+logger = logging.getLogger(__name__)
+
+# 两个文本框中心的纵向距离不超过较矮框高度的该比例时归为同一行
+ROW_TOLERANCE = 0.6
+# 倾斜估计只采用斜率绝对值不超过该值的同行框对（约 14°）
+MAX_SKEW = 0.25
+# 票价、车厢座位等被拆开的文本最多向右拼接的文本框数
+JOIN_SPAN = 3
+# 只有身份证号的文本框（姓名在同一行右侧的独立文本框中）
+ID_ONLY_LENGTHS = range(16, 19)
+
+
+def layout_tokens(record):
+    """
+    把 OCR 记录（rec_boxes 为 [x1, y1, x2, y2]）转为带几何信息的文本框列表 [(text, x, y, w, h)]（x/y 为中心点）。
+    没有 rec_boxes（或数量对不上）时返回 None
+    """
+    texts = record.get("rec_texts") or []
+    boxes = record.get("rec_boxes") or []
+    if len(boxes) != len(texts):
+        return None
+    tokens = []
+    for text, box in zip(texts, boxes):
+        text = text.strip()
+        if not text:
+            continue
+        x1, y1, x2, y2 = box
+        tokens.append((text, (x1 + x2) / 2, (y1 + y2) / 2, (x2 - x1) or 1, (y2 - y1) or 1))
+    return tokens
+
+
+def estimate_skew(tokens):
+    """
+    估计文本行的倾斜斜率 dy/dx：取纵向排序后相邻、纵向区间重叠且水平分开的框对，斜率取中位数
+    """
+    ordered = sorted(tokens, key=lambda t: t[2])
+    slopes = []
+    for (_, ax, ay, _, ah), (_, bx, by, _, bh) in zip(ordered, ordered[1:]):
+        dx = bx - ax
+        low, high = (ah, bh) if ah < bh else (bh, ah)
+        # 中心距离小于半高之和减去较矮框的一半，即纵向区间重叠超过较矮框高度的一半
+        if by - ay < (ah + bh - low) / 2 and (dx > high or dx < -high):
+            slope = (by - ay) / dx
+            if -MAX_SKEW <= slope <= MAX_SKEW:
+                slopes.append(slope)
+    if len(slopes) < 2:
+        return 0.0
+    slopes.sort()
+    return slopes[len(slopes) // 2]
+
+
+def build_rows(tokens):
+    """
+    按倾斜校正后的纵坐标把文本框聚成行（自上而下），行内按横坐标从左到右排序
+    """
+    skew = estimate_skew(tokens)
+    rows = []
+    row_y = row_h = 0.0
+    for corrected_y, token in sorted(((t[2] - skew * t[1], t) for t in tokens), key=lambda item: item[0]):
+        h = token[4]
+        if rows and abs(corrected_y - row_y) <= ROW_TOLERANCE * (h if h < row_h else row_h):
+            row = rows[-1]
+            row.append(token)
+            # 行的纵坐标与高度取已有成员的均值，适应同一行内字号不同的文本
+            row_y += (corrected_y - row_y) / len(row)
+            row_h += (h - row_h) / len(row)
+        else:
+            rows.append([token])
+            row_y, row_h = corrected_y, h
+    for row in rows:
+        row.sort(key=lambda t: t[1])
+    return rows
+
+
+def _char_x(token, offset):
+    """
+    按字符位置估计文本框内某个字符的中心横坐标
+    """
+    text, x, _, w, _ = token
+    return x - w / 2 + w * (offset + 0.5) / len(text)
+
+
+def _resolve_stations(stations, train):
+    """
+    以车次为锚点确定出发/到达站：与车次同一行（或相邻行）中，车次左侧最近的为出发站、右侧最近的为到达站；
+    缺失的一侧按阅读顺序取其余车站补齐
+    """
+    departure = arrival = ""
+    if train is not None:
+        train_row, train_x = train
+        left = [(x, name) for row, x, name in stations if abs(row - train_row) <= 1 and x < train_x]
+        right = [(x, name) for row, x, name in stations if abs(row - train_row) <= 1 and x > train_x]
+        if left:
+            departure = max(left)[1]
+        if right:
+            arrival = min(right)[1]
+
+    ordered = []
+    for _, _, name in stations:
+        if name not in ordered:
+            ordered.append(name)
+    remaining = [name for name in ordered if name not in (departure, arrival)]
+    if not departure and not arrival:
+        departure, arrival = (ordered + ["", ""])[:2]
+    elif not arrival and remaining:
+        arrival = remaining[0]
+    elif not departure and remaining:
+        departure = remaining[0]
+    return departure, arrival
+
+
+def parse_ticket_layout(record, station_index=None):
+    """
+    基于版面的车票解析：利用 rec_boxes 把文本框聚成行，以车次、"站"、"￥"等为锚点按相对位置抽取字段。
+    所有文本框只遍历一次，同一行内被拆开的文本（如 ['￥443.', '5元']、['02车', '031号']）按从左到右拼接后匹配。
+    记录中没有 rec_boxes 时退回按文本顺序解析的 parse_ticket_info；传入 station_index 时用车站名录校验和纠正站名
+    """
+    uncertain_texts = low_confidence_texts(record) if station_index is not None else ()
+    tokens = layout_tokens(record)
+    if tokens is None:
+        return parse_ticket_info(clean_texts(record.get("rec_texts") or []), station_index, uncertain_texts)
+
+    ticket_info = {field: "" for field in TICKET_FIELDS}
+    ticket_info["detection_id"] = 0
+    rows = build_rows(tokens) if tokens else []
+    logger.debug("版面行: %s", [[t[0] for t in row] for row in rows])
+
+    stations = []  # [(行号, 横坐标, 站名)]
+    train = None  # (行号, 横坐标)
+    datetime_row = -1
+    price_fallback = ""
+    carriage_fallback = seat_fallback = ""
+    name_fallbacks = []  # [(行号, 姓名)]
+    # 出发站通常在车次左侧、先于车次被遍历，按车次纠正站名时需要预先找出车次
+    train_code = ""
+    if station_index is not None:
+        train_code = next((m.group() for m in (TRAIN_CODE_PATTERN.search(t[0]) for t in tokens) if m), "")
+
+    for r, row in enumerate(rows):
+        texts = [token[0] for token in row]
+        for k, token in enumerate(row):
+            txt = token[0]
+            matched = False
+
+            if '站' in txt:
+                for name, start, end in find_stations(txt, station_index, train_code, txt in uncertain_texts):
+                    stations.append((r, _char_x(token, (start + end - 1) / 2), name))
+                    matched = True
+
+            if train is None:
+                tm = TRAIN_CODE_PATTERN.search(txt)
+                if tm:
+                    ticket_info["train_code"] = tm.group()
+                    train = (r, _char_x(token, (tm.start() + tm.end() - 1) / 2))
+                    matched = True
+
+            if not ticket_info["datetime"] and '年' in txt:
+                # 向右拼接同一行的相邻文本框，处理被 OCR 拆开的字段
+                ticket_info["datetime"] = match_datetime(txt) or match_datetime("".join(texts[k:k + JOIN_SPAN]))
+                if ticket_info["datetime"]:
+                    datetime_row = r
+                    matched = True
+
+            if not (ticket_info["carriage"] and ticket_info["seat_num"]):
+                combo = SEAT_COMBO_PATTERN.search("".join(texts[k:k + JOIN_SPAN])) if '车' in txt else None
+                if combo:
+                    ticket_info["carriage"] = ticket_info["carriage"] or combo.group(1)
+                    ticket_info["seat_num"] = ticket_info["seat_num"] or combo.group(2)
+                    if combo.group(3) and not ticket_info["berth_type"]:
+                        ticket_info["berth_type"] = combo.group(3)
+                    matched = True
+                elif len(txt) == 6 and txt[-1] in 'ABCDEF' and txt[:2].isdigit() and txt[3:-1].isdigit():
+                    # OCR 把"车"识别为数字：03403A → 03车03A号
+                    ticket_info["carriage"], ticket_info["seat_num"] = txt[:2], txt[3:]
+                    matched = True
+                elif '号' in txt:
+                    seat = SEAT_OCR_PATTERN.search(txt)
+                    if seat:
+                        ticket_info["carriage"], ticket_info["seat_num"] = seat.group(1), seat.group(2)
+                        matched = True
+                    elif not seat_fallback:
+                        seat_match = SEAT_NUM_PATTERN.search(txt)
+                        seat_fallback = seat_match.group(1) if seat_match else ""
+                if not matched and not carriage_fallback and '车' in txt:
+                    carriage_match = CARRIAGE_PATTERN.search(txt)
+                    carriage_fallback = carriage_match.group(1) if carriage_match else ""
+
+            if not ticket_info["berth_type"] and '铺' in txt:
+                for berth in BERTH_TYPES:
+                    if berth in txt:
+                        ticket_info["berth_type"] = berth
+                        matched = True
+                        break
+
+            if not ticket_info["price"]:
+                if '￥' in txt or '元' in txt:
+                    price_match = PRICE_PATTERN.search("".join(texts[k:k + JOIN_SPAN]))
+                    if price_match:
+                        ticket_info["price"] = price_match.group(1)
+                        matched = True
+                elif not price_fallback and r != datetime_row and '.' in txt:
+                    decimal_match = DECIMAL_PATTERN.search(txt)
+                    if decimal_match and 5 <= float(decimal_match.group(1)) <= 3000:
+                        price_fallback = decimal_match.group(1)
+
+            if not ticket_info["seat_type"] and ('座' in txt or '卧' in txt):
+                for seat_type in SEAT_TYPES:
+                    if seat_type in txt:
+                        ticket_info["seat_type"] = seat_type
+                        matched = True
+                        break
+
+            if matched:
+                continue
+
+            if not ticket_info["discount_type"]:
+                for keyword, discount in DISCOUNT_TYPES:
+                    if keyword in txt:
+                        ticket_info["discount_type"] = discount
+                        matched = True
+                        break
+                if matched:
+                    continue
+
+            if not ticket_info["name"]:
+                name_match = NAME_ID_PATTERN.search(txt)
+                if name_match:
+                    ticket_info["name"] = name_match.group(4)
+                    continue
+                name_match = NAME_ID_LOOSE_PATTERN.search(txt)
+                if name_match:
+                    ticket_info["name"] = name_match.group(1)
+                    continue
+                if len(txt) in ID_ONLY_LENGTHS and txt[:15].replace("*", "").isdigit() and k + 1 < len(row):
+                    # 身份证号与姓名被拆成同一行的两个文本框
+                    if NAME_ONLY_PATTERN.fullmatch(texts[k + 1]):
+                        ticket_info["name"] = texts[k + 1]
+                        continue
+                name_match = NAME_AFTER_DIGITS_PATTERN.search(txt)
+                if name_match:
+                    ticket_info["name"] = name_match.group(1)
+                    continue
+                if NAME_ONLY_PATTERN.fullmatch(txt) and not any(p in txt for p in NON_NAME_WORDS) and "站" not in txt:
+                    name_fallbacks.append((r, txt))
+
+    ticket_info["departure_station"], ticket_info["arrival_station"] = _resolve_stations(stations, train)
+    ticket_info["price"] = ticket_info["price"] or price_fallback
+    ticket_info["carriage"] = ticket_info["carriage"] or carriage_fallback
+    ticket_info["seat_num"] = ticket_info["seat_num"] or seat_fallback
+    if not ticket_info["name"] and name_fallbacks:
+        # 纯中文姓名只出现在发车时间所在行下方，优先取这些行中的候选
+        below = [name for r, name in name_fallbacks if r > datetime_row]
+        ticket_info["name"] = below[0] if below else name_fallbacks[0][1]
+    return ticket_info
@@ -0,0 +1,189 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import logging
+import sqlite3
+import threading
+
+logger = logging.getLogger(__name__)
+
+# 默认缓存上限：1 GB
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+
+
+def crop_key(crop_img, version=""):
+    """
+    按裁剪图像素内容 + 形状/类型 + 模型配置版本计算缓存键（同一像素在不同OCR配置下不会命中）
+    """
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(version.encode("utf-8"))
+    digest.update(f"|{crop_img.shape}|{crop_img.dtype}|".encode("utf-8"))
+    # tobytes 会把非连续的 numpy 视图复制成连续内存，相比 OCR 耗时可以忽略
+    digest.update(crop_img.tobytes())
+    return digest.hexdigest()
+
+
+class OCRCache:
+    """
+    以裁剪图内容哈希为键的持久化 OCR 结果缓存（单个 SQLite 文件）。
+    保存 rec_texts/rec_scores/rec_boxes，总大小超过 max_bytes 时按最近访问时间淘汰（LRU）；
+    另记录 (图片路径, detection_id) → 缓存键 的映射，可以不经 YOLO/OCR 按图片导出全部记录（见 iter_sources）
+    """
+
+    def __init__(self, path, max_bytes=DEFAULT_MAX_BYTES, version=""):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.version = version
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS ocr_cache ("
+            "key TEXT PRIMARY KEY, record TEXT NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_ocr_cache_last_access ON ocr_cache (last_access)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS ocr_sources ("
+            "source TEXT NOT NULL, detection_id INTEGER NOT NULL, key TEXT NOT NULL, "
+            "PRIMARY KEY (source, detection_id))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_ocr_sources_key ON ocr_sources (key)")
+        self._conn.commit()
+        self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM ocr_cache").fetchone()[0]
+
+    def key(self, crop_img, version=None):
+        """
+        裁剪图的缓存键；version 为空时使用缓存自身的版本
+        """
+        return crop_key(crop_img, self.version if version is None else version)
+
+    def get(self, key):
+        """
+        返回缓存的 OCR 记录，未命中返回 None
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT record FROM ocr_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute("UPDATE ocr_cache SET last_access = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+        return json.loads(row[0])
+
+    def put(self, key, record):
+        payload = json.dumps(record, ensure_ascii=False)
+        size = len(payload.encode("utf-8"))
+        with self._lock:
+            old = self._conn.execute("SELECT size FROM ocr_cache WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO ocr_cache (key, record, size, last_access) VALUES (?, ?, ?, ?)",
+                (key, payload, size, time.time()),
+            )
+            self._total_bytes += size - (old[0] if old else 0)
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+            self._conn.commit()
+
+    def add_sources(self, entries):
+        """
+        记录 [(图片路径, detection_id, 缓存键)]：同一图片的同一检测目标以最新一次运行为准
+        """
+        if not entries:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO ocr_sources (source, detection_id, key) VALUES (?, ?, ?)", entries)
+            self._conn.commit()
+
+    def iter_sources(self):
+        """
+        按 (图片路径, detection_id) 顺序逐条产出 {"path", "detection_id", "rec_texts", "rec_scores", "rec_boxes"}，
+        格式与 bulk_parse.py 的 JSONL 输入相同；记录已被淘汰的检测目标跳过
+        """
+        with self._lock:
+            self._conn.commit()
+        # 单独的只读连接逐行读取，导出大缓存时不把全部记录读入内存，也不占用写连接的锁
+        conn = sqlite3.connect(self.path)
+        try:
+            rows = conn.execute(
+                "SELECT s.source, s.detection_id, c.record FROM ocr_sources s JOIN ocr_cache c ON c.key = s.key "
+                "ORDER BY s.source, s.detection_id")
+            for source, detection_id, payload in rows:
+                record = {"path": source, "detection_id": detection_id}
+                record.update(json.loads(payload))
+                yield record
+        finally:
+            conn.close()
+
+    def export_jsonl(self, path):
+        """
+        把 iter_sources 的记录写为 JSON-lines，返回条数
+        """
+        count = 0
+        with open(path, "w", encoding="utf-8") as f:
+            for record in self.iter_sources():
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                count += 1
+        return count
+
+    def _evict(self):
+        """
+        按最近访问时间从旧到新淘汰，直到总大小回到上限的 90% 以下
+        """
+        target = self.max_bytes * 0.9
+        evicted = 0
+        while self._total_bytes > target:
+            rows = self._conn.execute(
+                "SELECT key, size FROM ocr_cache ORDER BY last_access LIMIT 256").fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                if self._total_bytes <= target:
+                    break
+                self._conn.execute("DELETE FROM ocr_cache WHERE key = ?", (key,))
+                self._conn.execute("DELETE FROM ocr_sources WHERE key = ?", (key,))
+                self._total_bytes -= size
+                evicted += 1
+        logger.debug("OCR缓存淘汰 %d 条记录，当前大小 %d 字节", evicted, self._total_bytes)
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM ocr_cache").fetchone()[0]
+
+    @property
+    def total_bytes(self):
+        return self._total_bytes
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.commit()
+                self._conn.close()
+                self._conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+if __name__ == '__main__':
+    # python ocr_cache.py 缓存文件 输出.jsonl：导出按图片排列的OCR记录，供 bulk_parse.py 重新解析
+    if len(sys.argv) != 3:
+        sys.exit("用法: python ocr_cache.py <缓存文件.sqlite> <输出.jsonl>")
+    if not os.path.exists(sys.argv[1]):
+        sys.exit(f"缓存文件不存在: {sys.argv[1]}")
+    with OCRCache(sys.argv[1], max_bytes=float("inf")) as cache:
+        exported = cache.export_jsonl(sys.argv[2])
+    print(f"已导出 {exported} 条OCR记录到 {sys.argv[2]}")
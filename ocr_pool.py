@@ -0,0 +1,117 @@
+import os
+import logging
+import multiprocessing
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# 限制每个 worker 内数学库线程数的环境变量
+THREAD_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS", "NUMEXPR_NUM_THREADS")
+
+# worker 进程内的 PaddleOCR 实例（每个进程初始化一次）
+_worker_ocr = None
+
+
+def _init_worker(threads):
+    global _worker_ocr
+    # 延迟导入：spawn 出的 worker 只有在这里才加载 PaddleOCR
+    from yolo_ocr import load_ocr
+    _worker_ocr = load_ocr(cpu_threads=threads)
+
+
+def _recognize_shared(task):
+    """
+    worker 中执行：从共享内存取出裁剪图（不复制），OCR 后返回 (detection_id, 记录)
+    """
+    from yolo_ocr import ocr_to_record
+
+    detection_id, shm_name, offset, shape, dtype, dump_prefix = task
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        crop_img = np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=offset)
+        record = ocr_to_record(_worker_ocr, crop_img, dump_prefix=dump_prefix)
+        # 释放对共享内存的引用后才能关闭
+        del crop_img
+    finally:
+        shm.close()
+    return detection_id, record
+
+
+@contextmanager
+def _thread_limits(threads):
+    """
+    创建 worker 期间临时设置线程数环境变量，使子进程在导入数学库前就继承限制
+    """
+    saved = {name: os.environ.get(name) for name in THREAD_ENV_VARS}
+    for name in THREAD_ENV_VARS:
+        os.environ[name] = str(threads)
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+class OCRWorkerPool:
+    """
+    多进程 OCR：每个 worker 持有自己的 PaddleOCR 实例（只初始化一次），
+    裁剪图一次性写入共享内存后按偏移量分发，结果按输入顺序返回
+    """
+
+    def __init__(self, workers=None, threads_per_worker=1):
+        self.threads_per_worker = max(1, threads_per_worker)
+        self.workers = workers or max(1, (os.cpu_count() or 1) // self.threads_per_worker)
+        # Paddle 不保证 fork 安全，使用 spawn 启动全新的 worker 进程
+        context = multiprocessing.get_context("spawn")
+        with _thread_limits(self.threads_per_worker):
+            self._pool = context.Pool(self.workers, initializer=_init_worker, initargs=(self.threads_per_worker,))
+        logger.info("OCR进程池已启动：%d 个 worker，每个 %d 线程", self.workers, self.threads_per_worker)
+
+    def map(self, crops, dump_prefixes=None):
+        """
+        并行识别 [(detection_id, 裁剪图)]，返回与输入顺序一致的记录列表
+        """
+        if not crops:
+            return []
+        if dump_prefixes is None:
+            dump_prefixes = [None] * len(crops)
+
+        # 所有裁剪图放进同一块共享内存，减少分配次数；worker 端直接在其上构造视图
+        total = sum(crop_img.nbytes for _, crop_img in crops)
+        shm = shared_memory.SharedMemory(create=True, size=max(total, 1))
+        try:
+            tasks = []
+            offset = 0
+            for (detection_id, crop_img), dump_prefix in zip(crops, dump_prefixes):
+                view = np.ndarray(crop_img.shape, dtype=crop_img.dtype, buffer=shm.buf, offset=offset)
+                view[...] = crop_img
+                del view
+                tasks.append((detection_id, shm.name, offset, crop_img.shape, crop_img.dtype.str, dump_prefix))
+                offset += crop_img.nbytes
+
+            results = self._pool.map(_recognize_shared, tasks, chunksize=1)
+        finally:
+            shm.close()
+            shm.unlink()
+
+        for (expected_id, _), (detection_id, _) in zip(crops, results):
+            if expected_id != detection_id:
+                raise RuntimeError(f"OCR进程池返回顺序与输入不一致: 期望 {expected_id}，实际 {detection_id}")
+        return [record for _, record in results]
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,50 @@
+import json
+import logging
+import sys
+import time
+
+# 日志格式：生产环境静默运行时只输出 WARNING 及以上
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+
+def setup_logging(verbosity=0):
+    """
+    按详细程度配置日志：-1 只输出警告，0 输出进度摘要，1 及以上输出每个文本块和解析字段
+    """
+    if verbosity < 0:
+        level = logging.WARNING
+    elif verbosity == 0:
+        level = logging.INFO
+    else:
+        level = logging.DEBUG
+    logging.basicConfig(level=level, format=LOG_FORMAT, stream=sys.stderr, force=True)
+
+
+class EventLog:
+    """
+    JSON-lines 事件流：每行一个事件（图片id、检测数、各阶段耗时、为空的字段等），
+    便于机器聚合诊断信息；path 为空时不输出任何内容
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self._file = open(path, "a", encoding="utf-8") if path else None
+
+    def emit(self, event, **fields):
+        if self._file is None:
+            return
+        record = {"ts": round(time.time(), 3), "event": event}
+        record.update(fields)
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
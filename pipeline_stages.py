@@ -0,0 +1,94 @@
+import queue
+import logging
+import threading
+from stage_timer import StageTimer
+
+logger = logging.getLogger(__name__)
+
+# 队列中表示上游结束（或出错）的标记
+_DONE = object()
+# 上游线程等待队列空位时检查停止信号的间隔（秒）
+_PUT_POLL = 0.1
+
+
+class ImageItem:
+    """
+    在流水线各阶段之间传递的单张图片：各阶段只填写自己产出的字段，并尽早释放不再需要的大对象
+    （YOLO 结果和解码后的整图在裁剪后即置为 None）；timer 记录该图片在各阶段的耗时
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.timer = StageTimer()
+        self.prepared = None  # preprocess.PreparedImage
+        self.result = None  # ultralytics Results
+        self.crops = None  # [(detection_id, 裁剪图)]
+        self.boxes = None  # [[x1, y1, x2, y2]]
+        self.dump_prefixes = None
+        self.records = None  # OCR 记录列表
+        self.tickets = None
+
+
+def chunked(iterable, size):
+    """
+    把迭代器按 size 个一组切分，逐组产出列表（最后一组可能不足 size 个）
+    """
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _put(q, stop, value):
+    """
+    向有界队列放入 value，队列已满时等待；下游已停止时放弃并返回 False
+    """
+    while not stop.is_set():
+        try:
+            q.put(value, timeout=_PUT_POLL)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def bounded(iterable, maxsize, name="pipeline-stage"):
+    """
+    在后台线程中运行上游阶段，通过容量为 maxsize 的队列把产出交给下游：
+    上游最多领先下游 maxsize 项（内存有界），同时与下游并行（YOLO/解码与 OCR 互相重叠）。
+    上游的异常在下游取到该位置时重新抛出；下游提前结束时通知上游线程退出。maxsize 为 0 时不启用线程
+    """
+    if maxsize <= 0:
+        yield from iterable
+        return
+
+    q = queue.Queue(maxsize)
+    stop = threading.Event()
+
+    def worker():
+        try:
+            for item in iterable:
+                if not _put(q, stop, (item, None)):
+                    return
+        except BaseException as exc:
+            _put(q, stop, (_DONE, exc))
+            return
+        _put(q, stop, (_DONE, None))
+
+    thread = threading.Thread(target=worker, name=name, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item, exc = q.get()
+            if item is _DONE:
+                if exc is not None:
+                    raise exc
+                return
+            yield item
+    finally:
+        stop.set()
+        thread.join()
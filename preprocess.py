@@ -0,0 +1,131 @@
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 支持的降分辨率倍数：JPEG 在解码时直接按 1/2、1/4、1/8 缩小（cv2.IMREAD_REDUCED_*），其他格式解码后缩小
+REDUCED_SCALES = (1, 2, 4, 8)
+# 默认用 1/2 分辨率做检测，从全分辨率图裁剪
+DEFAULT_DETECT_SCALE = 2
+DEFAULT_CROP_SCALE = 1
+# OCR 前把裁剪图缩放到的高度（像素）；0 表示保持裁剪尺寸
+DEFAULT_CROP_HEIGHT = 800
+# 较矮的裁剪图最多放大的倍数（放大不会增加细节，只避免文字过小；同时防止误检的小框被放得过大）
+MAX_UPSCALE = 2.0
+
+
+def _imread_flag(cv2, scale):
+    if scale not in REDUCED_SCALES:
+        raise ValueError(f"不支持的降分辨率倍数: {scale}（可选 {REDUCED_SCALES}）")
+    return {
+        1: cv2.IMREAD_COLOR,
+        2: cv2.IMREAD_REDUCED_COLOR_2,
+        4: cv2.IMREAD_REDUCED_COLOR_4,
+        8: cv2.IMREAD_REDUCED_COLOR_8,
+    }[scale]
+
+
+def decode_image(path, scale=1):
+    """
+    按 1/scale 分辨率解码图片文件
+    """
+    import cv2
+
+    img = cv2.imread(path, _imread_flag(cv2, scale))
+    if img is None:
+        raise ValueError(f"无法读取图片: {path}")
+    return img
+
+
+def decode_bytes(data, scale=1):
+    """
+    按 1/scale 分辨率解码内存中的图片字节，无法解码时返回 None
+    """
+    import cv2
+    import numpy as np
+
+    return cv2.imdecode(np.frombuffer(data, np.uint8), _imread_flag(cv2, scale))
+
+
+def resize_to_height(img, height, upscale=True):
+    """
+    把裁剪图等比缩放到 height，使文字高度大致一致：较高的用 INTER_AREA 缩小；
+    较矮的用 INTER_CUBIC 放大（最多 MAX_UPSCALE 倍），upscale 为 False 时保持不变
+    """
+    if not height or img.shape[0] == height or img.shape[0] == 0:
+        return img
+    if img.shape[0] < height:
+        if not upscale:
+            return img
+        height = min(height, round(img.shape[0] * MAX_UPSCALE))
+    import cv2
+
+    width = max(1, round(img.shape[1] * height / img.shape[0]))
+    interpolation = cv2.INTER_AREA if height < img.shape[0] else cv2.INTER_CUBIC
+    return cv2.resize(img, (width, height), interpolation=interpolation)
+
+
+class PreparedImage:
+    """
+    预处理后的图片：detect_img 送入 YOLO，crop_img 用于裁剪（两者相同时只解码一次）；
+    decode_seconds 为解码耗时
+    """
+
+    def __init__(self, path, detect_img, crop_img, detect_scale, crop_scale, crop_height, decode_seconds=0.0):
+        self.path = path
+        self.detect_img = detect_img
+        self.crop_img = crop_img
+        self.detect_scale = detect_scale
+        self.crop_scale = crop_scale
+        self.crop_height = crop_height
+        self.decode_seconds = decode_seconds
+
+    def crop(self, result):
+        """
+        把检测框从检测分辨率映射到裁剪图分辨率后裁剪，并缩放到目标高度（较矮的裁剪图放大）；
+        返回 [(detection_id, 裁剪图, 全分辨率下的 [x1, y1, x2, y2])]，与 crop_detections 格式相同
+        """
+        crops = []
+        boxes = result.boxes
+        if boxes is None:
+            return crops
+        factor = self.detect_scale / self.crop_scale
+        height, width = self.crop_img.shape[:2]
+        for i, box in enumerate(boxes):
+            x1, y1, x2, y2 = (float(v) for v in box.xyxy[0].cpu().numpy())
+            cx1, cy1 = max(0, int(x1 * factor)), max(0, int(y1 * factor))
+            cx2, cy2 = min(width, int(x2 * factor)), min(height, int(y2 * factor))
+            crop_img = resize_to_height(self.crop_img[cy1:cy2, cx1:cx2], self.crop_height)
+            full_box = [int(x1 * self.detect_scale), int(y1 * self.detect_scale),
+                        int(x2 * self.detect_scale), int(y2 * self.detect_scale)]
+            crops.append((i, crop_img, full_box))
+        return crops
+
+
+class Preprocessor:
+    """
+    预处理配置：以 1/detect_scale 分辨率解码用于检测，以 1/crop_scale 分辨率解码用于裁剪，
+    检测框映射回裁剪分辨率（输出坐标为全分辨率），裁剪图缩放到 crop_height 后再 OCR
+    """
+
+    def __init__(self, detect_scale=DEFAULT_DETECT_SCALE, crop_scale=DEFAULT_CROP_SCALE,
+                 crop_height=DEFAULT_CROP_HEIGHT):
+        for scale in (detect_scale, crop_scale):
+            if scale not in REDUCED_SCALES:
+                raise ValueError(f"不支持的降分辨率倍数: {scale}（可选 {REDUCED_SCALES}）")
+        self.detect_scale = detect_scale
+        self.crop_scale = crop_scale
+        self.crop_height = crop_height
+
+    def load(self, path):
+        start = time.perf_counter()
+        detect_img = decode_image(path, self.detect_scale)
+        if self.crop_scale == self.detect_scale:
+            crop_img = detect_img
+        else:
+            crop_img = decode_image(path, self.crop_scale)
+        return PreparedImage(path, detect_img, crop_img, self.detect_scale, self.crop_scale, self.crop_height,
+                             time.perf_counter() - start)
+
+    def describe(self):
+        return f"detect 1/{self.detect_scale}, crop 1/{self.crop_scale}, height {self.crop_height or 'native'}"
@@ -0,0 +1,181 @@
+import io
+import sys
+import logging
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# 汇总表中输出的分位数
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(values, pct):
+    """
+    线性插值计算分位数（values 无需预先排序）
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100.0
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+class StageTimer:
+    """
+    阶段计时注册表：用 with timer.stage("ocr") 包住流水线的每个阶段，
+    begin_image/end_image 之间的耗时归入同一张图片，最后汇总各阶段的分位数
+    """
+
+    def __init__(self):
+        self.images = []  # [(image_id, {stage: seconds})]
+        self.samples = defaultdict(list)  # stage -> 每张图片的耗时列表
+        self._image_id = None
+        self._current = defaultdict(float)
+
+    def begin_image(self, image_id):
+        self._image_id = image_id
+        self._current = defaultdict(float)
+
+    def add(self, name, seconds):
+        """
+        直接记录一段已知耗时（如 ultralytics 自带的 speed）
+        """
+        self._current[name] += seconds
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._current[name] += time.perf_counter() - start
+
+    def end_image(self):
+        """
+        结束当前图片，返回该图片各阶段耗时（含 total）
+        """
+        durations = dict(self._current)
+        durations["total"] = sum(durations.values())
+        self.images.append((self._image_id, durations))
+        for name, seconds in durations.items():
+            self.samples[name].append(seconds)
+        self._image_id = None
+        self._current = defaultdict(float)
+        return durations
+
+    def record_image(self, image_id, durations):
+        """
+        直接记录一张图片的各阶段耗时（流水线中各阶段在别处分别计时时使用），返回含 total 的耗时
+        """
+        self.begin_image(image_id)
+        for name, seconds in durations.items():
+            self.add(name, seconds)
+        return self.end_image()
+
+    def summary(self):
+        """
+        返回每个阶段的汇总统计：{stage: {"count", "total", "mean", "p50", "p95", "p99"}}（秒）
+        """
+        stats = {}
+        for name, values in self.samples.items():
+            row = {"count": len(values), "total": sum(values), "mean": sum(values) / len(values)}
+            for pct in PERCENTILES:
+                row[f"p{pct}"] = percentile(values, pct)
+            stats[name] = row
+        return stats
+
+    def format_summary(self):
+        """
+        以表格形式输出各阶段耗时（毫秒），total 放在最后一行
+        """
+        stats = self.summary()
+        header = f"{'stage':<12}{'count':>7}{'total(s)':>10}{'mean':>9}" + "".join(f"{'p' + str(p):>9}" for p in PERCENTILES)
+        lines = [header, "-" * len(header)]
+        for name in sorted(stats, key=lambda n: (n == "total", n)):
+            row = stats[name]
+            line = f"{name:<12}{row['count']:>7}{row['total']:>10.2f}{row['mean'] * 1000:>9.1f}"
+            line += "".join(f"{row[f'p{p}'] * 1000:>9.1f}" for p in PERCENTILES)
+            lines.append(line)
+        return "\n".join(lines)
+
+
+@contextmanager
+def profiled(kind=None, output=None):
+    """
+    可选的整体性能剖析：kind 为 "cprofile" 或 "pyinstrument"，为空时不做任何事。
+    output 为结果文件路径（cProfile 写 .prof，pyinstrument 写 .html）
+    """
+    if not kind:
+        yield
+        return
+
+    if kind == "cprofile":
+        import cProfile
+        import pstats
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            if output:
+                profiler.dump_stats(output)
+                logger.info("cProfile 结果已保存到 %s", output)
+            stream = io.StringIO()
+            pstats.Stats(profiler, stream=stream).sort_stats("cumulative").print_stats(20)
+            logger.info("cProfile 累计耗时前20:\n%s", stream.getvalue())
+    elif kind == "pyinstrument":
+        try:
+            from pyinstrument import Profiler
+        except ImportError as e:
+            raise ImportError("使用 --profile pyinstrument 需要先安装 pyinstrument") from e
+        profiler = Profiler()
+        profiler.start()
+        try:
+            yield
+        finally:
+            profiler.stop()
+            if output:
+                with open(output, "w", encoding="utf-8") as f:
+                    f.write(profiler.output_html())
+                logger.info("pyinstrument 结果已保存到 %s", output)
+            logger.info("pyinstrument 剖析结果:\n%s", profiler.output_text())
+    else:
+        raise ValueError(f"不支持的剖析方式: {kind}")
+
+
+def peak_rss_mb():
+    """
+    当前进程的峰值常驻内存（MB）；Linux/macOS 使用 getrusage，Windows 使用 GetProcessMemoryInfo
+    """
+    try:
+        import resource
+    except ImportError:
+        return _windows_peak_rss_mb()
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS 上 ru_maxrss 单位为字节，Linux 上为 KB
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _windows_peak_rss_mb():
+    import ctypes
+    from ctypes import wintypes
+
+    class ProcessMemoryCounters(ctypes.Structure):
+        _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD),
+                    ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                    ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                    ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t), ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                    ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t)]
+
+    counters = ProcessMemoryCounters()
+    counters.cb = ctypes.sizeof(counters)
+    process = ctypes.windll.kernel32.GetCurrentProcess()
+    if not ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+        return 0.0
+    return counters.PeakWorkingSetSize / (1024 * 1024)
@@ -0,0 +1,233 @@
+import os
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 随仓库附带的车站名录（每行一个站名，不含"站"字）
+STATIONS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "stations.txt")
+# 前缀树节点中标记"到此为一个完整站名"的键（单字符键不会与之冲突）
+END = ""
+# 纠错时允许的最大编辑距离；两字站名只有在该车次已知途经时才纠错，避免把任意两字词改成站名
+MAX_EDITS = 1
+MIN_CORRECT_LENGTH = 3
+# 名录中的站名加方位字（"郑州" + "南"）是常见的真实站名，名录不全时不应把它们纠正成别的站
+DIRECTION_SUFFIXES = "东南西北"
+# 站名前可以去掉的路线用语（"开往西安北站"）；其他前缀可能是站名的一部分（"马鞍山"不能截成"鞍山"）
+ROUTE_WORDS = ("开往", "经由", "到", "至", "往", "经", "由")
+# rec_score 低于该值的文本块才在全部站名中纠错（名录不全，识别可信的站名即使不在名录中也原样保留）
+CORRECT_BELOW_SCORE = 0.9
+
+
+def load_station_names(path=STATIONS_PATH):
+    """
+    读取车站名录，忽略空行和 "#" 注释，去掉站名末尾的"站"字
+    """
+    names = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            name = line.strip()
+            if not name or name.startswith("#"):
+                continue
+            names.append(name[:-1] if name.endswith("站") and len(name) > 2 else name)
+    return names
+
+
+def load_train_stations(reference_path):
+    """
+    从历史抽取结果（与 data/ticket_result_qwen3-vl_8b.json 格式相同）建立 车次 → 途经车站集合 的索引
+    """
+    with open(reference_path, "r", encoding="utf-8") as f:
+        items = json.load(f)
+    train_stations = {}
+    for item in items:
+        data = item.get("data") or {}
+        train_code = (data.get("train_code") or "").strip()
+        if not train_code:
+            continue
+        for field in ("departure_station", "arrival_station"):
+            name = (data.get(field) or "").strip()
+            if name.endswith("站") and len(name) > 2:
+                name = name[:-1]
+            if name and name not in ("无", "None"):
+                train_stations.setdefault(train_code, set()).add(name)
+    # 排序保证纠错结果与哈希顺序无关
+    return {train_code: sorted(names) for train_code, names in train_stations.items()}
+
+
+def low_confidence_texts(record, threshold=CORRECT_BELOW_SCORE):
+    """
+    OCR 记录中 rec_score 低于 threshold 的文本（去掉首尾空白）；记录中没有 rec_scores 时返回空集合
+    """
+    texts = record.get("rec_texts") or []
+    scores = record.get("rec_scores") or []
+    if len(scores) != len(texts):
+        return frozenset()
+    return frozenset(text.strip() for text, score in zip(texts, scores) if score < threshold)
+
+
+def deletions(word):
+    """
+    word 本身及删去任意一个字符后的所有变体（编辑距离 1 以内的两个词至少共享一个变体）
+    """
+    return {word} | {word[:i] + word[i + 1:] for i in range(len(word))}
+
+
+def edit_distance(a, b, limit=MAX_EDITS):
+    """
+    两个字符串的编辑距离；超过 limit 时提前返回 limit + 1
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    row = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        new_row = [i]
+        for j, cb in enumerate(b, 1):
+            new_row.append(min(new_row[j - 1] + 1, row[j] + 1, row[j - 1] + (ca != cb)))
+        if min(new_row) > limit:
+            return limit + 1
+        row = new_row
+    return row[-1]
+
+
+class StationTrie:
+    """
+    站名前缀树（嵌套字典，节点按字符分支）：查询与后缀匹配都是 O(文本长度)
+    """
+
+    def __init__(self, names=()):
+        self.root = {}
+        # 反向前缀树：从"站"字前往回匹配，一次扫描找出文本末尾最长的已知站名
+        self._reversed = {}
+        self.size = 0
+        for name in names:
+            self.add(name)
+
+    def add(self, name):
+        if len(name) < 2 or name in self:
+            return
+        for root, chars in ((self.root, name), (self._reversed, reversed(name))):
+            node = root
+            for ch in chars:
+                node = node.setdefault(ch, {})
+            node[END] = name
+        self.size += 1
+
+    def __contains__(self, name):
+        node = self.root
+        for ch in name:
+            node = node.get(ch)
+            if node is None:
+                return False
+        return END in node
+
+    def __len__(self):
+        return self.size
+
+    def longest_suffix(self, text):
+        """
+        返回 text 末尾最长的已知站名（如 "开往民权" → "民权"），没有返回空串
+        """
+        node = self._reversed
+        found = ""
+        for ch in reversed(text):
+            node = node.get(ch)
+            if node is None:
+                break
+            found = node.get(END, found)
+        return found
+
+
+class StationIndex:
+    """
+    车站名录 + 车次途经站索引，供解析器校验和纠正"XX站"中的站名：
+    名录中的站名原样接受，前面只有路线用语（"开往"、"到"）时截取该站名；否则在该车次途经站中按编辑距离纠错；
+    名录并不完整，全部站名中的纠错只用于 OCR 置信度低的文本（且不是 plausible 的站名），
+    使用删除变体索引，查询只需 O(长度) 次字典查找。纠错得到的站名不视为已知站名；
+    strict 为 False 时名录外的站名原样保留（交给解析器的干扰词规则判断），为 True 时丢弃
+    """
+
+    def __init__(self, names=(), train_stations=None, strict=False):
+        self.trie = StationTrie()
+        self.train_stations = train_stations or {}
+        self.strict = strict
+        # 删除变体 → 站名列表
+        self._variants = {}
+        for name in names:
+            self.add(name)
+        for stations in self.train_stations.values():
+            for name in stations:
+                self.add(name)
+
+    def add(self, name):
+        if len(name) < 2 or name in self.trie:
+            return
+        self.trie.add(name)
+        if len(name) >= MIN_CORRECT_LENGTH:
+            for variant in deletions(name):
+                self._variants.setdefault(variant, []).append(name)
+
+    def correct(self, word):
+        """
+        返回与 word 等长、编辑距离不超过 MAX_EDITS 的已知站名（多个时取距离最小、名录中靠前的），没有返回空串；
+        只纠正认错的字，不增删字（"平顶山"不应变成"平顶山西"）
+        """
+        best, best_distance = "", MAX_EDITS + 1
+        for variant in deletions(word):
+            for name in self._variants.get(variant, ()):
+                if len(name) != len(word):
+                    continue
+                distance = edit_distance(word, name)
+                if distance < best_distance:
+                    best, best_distance = name, distance
+        return best
+
+    def plausible(self, name):
+        """
+        名录外的站名是否可信（不做纠错）：已知站名加方位字，如名录中没有的"郑州南"、"长沙西"；
+        或加方位字后是已知站名，如名录中只有"马鞍山东"时的"马鞍山"
+        """
+        if len(name) > 2 and name[-1] in DIRECTION_SUFFIXES and name[:-1] in self.trie:
+            return True
+        return any(name + direction in self.trie for direction in DIRECTION_SUFFIXES)
+
+    @classmethod
+    def load(cls, path=STATIONS_PATH, reference_path=None, strict=False, exclude=()):
+        """
+        从名录文件（和历史抽取结果）建立索引；exclude 中的站名不加入名录（评测时留出参考答案中的站名）
+        """
+        exclude = set(exclude)
+        names = [name for name in load_station_names(path) if name not in exclude]
+        train_stations = load_train_stations(reference_path) if reference_path else None
+        index = cls(names, train_stations, strict=strict)
+        logger.debug("车站名录已加载: %d 个站名，%d 个车次", len(index.trie), len(index.train_stations))
+        return index
+
+    def resolve(self, candidate, train_code="", uncertain=False):
+        """
+        把正则抓到的"站"字前的文本解析为站名：
+        返回 (站名, 是否为名录中原样出现的站名)，纠错得到的站名返回 False；无法识别时返回 ("", False)。
+        uncertain 为 True（该文本块 OCR 置信度低）时才在全部站名中纠错
+        """
+        if candidate in self.trie:
+            return candidate, True
+        suffix = self.trie.longest_suffix(candidate)
+        if suffix and candidate[:-len(suffix)].endswith(ROUTE_WORDS):
+            return suffix, True
+
+        # 该车次途经的车站优先：OCR 常把单个字识别错（如"氏权" → "民权"）；只匹配整段或路线用语之后的部分
+        for name in self.train_stations.get(train_code, ()):
+            for start in range(max(0, len(candidate) - len(name) - MAX_EDITS), len(candidate) - 1):
+                if start and not candidate[:start].endswith(ROUTE_WORDS):
+                    continue
+                if edit_distance(candidate[start:], name) <= MAX_EDITS:
+                    return name, False
+
+        # 全部站名中纠错：只对置信度低、三个字及以上的整段文本纠错，不截取后缀
+        if uncertain and len(candidate) >= MIN_CORRECT_LENGTH and not self.plausible(candidate):
+            name = self.correct(candidate)
+            if name:
+                return name, False
+        if self.strict:
+            return "", False
+        return candidate, False
@@ -1,5 +1,73 @@
 import re
 import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 解析结果中的车票字段（detection_id 除外）
+TICKET_FIELDS = ("train_code", "departure_station", "arrival_station", "datetime", "carriage", "seat_num",
+                 "berth_type", "price", "seat_type", "name", "discount_type")
+
+
+# ---------------------------------------------------------------------------
+# 字段抽取规则：所有正则在导入时编译一次，关键词表使用不可变集合/元组
+# ---------------------------------------------------------------------------
+
+# 车站："XX站"
+STATION_PATTERN = re.compile(r'([\u4e00-\u9fa5]{2,6})站')
+# 车站名中包含这些词时视为干扰（铺位、"限乘当日当次车"、"仅供报销使用"等）
+STATION_INTERFERENCE = frozenset({"上铺", "中铺", "下铺", "限乘", "当日", "当次", "车", "号", "开", "元", "报销", "使用"})
+# 干扰词合并为一个多模式匹配器，一次扫描判断是否包含任意干扰词
+STATION_INTERFERENCE_PATTERN = re.compile("|".join(sorted(STATION_INTERFERENCE, key=len, reverse=True)))
+
+# 车次：全局解析时要求前后不紧邻数字或大写字母
+TRAIN_CODE_PATTERN = re.compile(r'(?<![0-9A-Z])([GDCKTZ]\d{1,4})(?![0-9A-Z])')
+# 车次：逐块解析时只要求前后不紧邻数字
+TRAIN_CODE_LOOSE_PATTERN = re.compile(r'(?<![0-9])([GDCKTZ]\d{1,4})(?![0-9])')
+
+# 发车时间（按优先级排序）
+TIME_PATTERNS = (
+    # 泛化分隔符: "2020年08月29日20：54开"、"2025年01月18H13:46"
+    re.compile(r'(\d{4}年\d{1,2}月)(\d{1,2})[^\d:\s]{1,3}?(\d{1,2})[:：](\d{2})开?'),
+    # 格式1: "2020年08月29日20：54开" 或 "2020年08月29日:20:54开"
+    re.compile(r'(\d{4}年\d{1,2}月\d{1,2}日)[\s:：]*(\d{1,2})[:：](\d{2})开?'),
+    # 格式2: "2020年08月29日 20:54"（有空格）
+    re.compile(r'(\d{4}年\d{1,2}月\d{1,2}日)\s+(\d{1,2})[:：](\d{2})'),
+    # 格式3: 紧凑型 "2020年08月29日2054"
+    re.compile(r'(\d{4}年\d{1,2}月\d{1,2}日)(\d{2})(\d{2})'),
+)
+# 粘连时间: "2024年02月26014:08" → "2024年02月26日 14:08"
+STICKY_TIME_PATTERN = re.compile(r'(\d{4}年\d{1,2}月)(\d{4,6}):(\d{2})')
+
+# 车厢号+座位号+铺位类型: "09车14F号上铺"、"3车02号中铺"
+SEAT_COMBO_PATTERN = re.compile(r'(\d+)车(\d+[A-F]?)号(上铺|中铺|下铺)?')
+# OCR把"车"识别成符号: "03+12C号"、"05#08A号"
+SEAT_OCR_PATTERN = re.compile(r'(\d{1,2})[^\u4e00-\u9fa5\dA-Za-z]{1,3}?(\d{1,2}[A-F]?)号')
+CARRIAGE_PATTERN = re.compile(r'(\d+)车')
+SEAT_NUM_PATTERN = re.compile(r'(\d+[A-F]?)号')
+BERTH_TYPES = ("上铺", "中铺", "下铺")
+
+# 票价
+PRICE_PATTERN = re.compile(r'￥?(\d+\.?\d*)元?')
+PRICE_KEYWORDS = ('￥', '元')
+DECIMAL_PATTERN = re.compile(r'(\d+\.\d+)')
+
+# 座位类型（长词在前，保证"新空调硬卧"优先于"硬卧"）
+SEAT_TYPES = ('新空调硬座', '新空调硬卧', '新空调软座', '新空调软卧', "一等座", "二等座", "商务座", "特等座",
+              "硬座", "软座", "硬卧", "软卧")
+# 优惠类型：(关键词, 输出值)，"学惠"/"学"/"惠"都归为学生票
+DISCOUNT_TYPES = (("学生票", "学生票"), ("儿童票", "儿童票"), ("优惠票", "优惠票"), ("残疾军人票", "残疾军人票"),
+                  ("学惠", "学生票"), ("学", "学生票"), ("惠", "学生票"))
+
+# 姓名：「6位地区码 + 8-10位（数字+*） + 4位校验码」后面的中文
+NAME_ID_PATTERN = re.compile(r'(\d{6})([\d\*]{8,10})([\dXx]{4})([\u4e00-\u9fa5]+)')
+# 备用规则1：15-17位（数字+*）+ 结尾（数字/X/x）后面的中文
+NAME_ID_LOOSE_PATTERN = re.compile(r'[\d\*]{15,17}[\dXx]([\u4e00-\u9fa5]+)')
+# 备用规则2：数字+空格+中文姓名（如"5678 张三"）
+NAME_AFTER_DIGITS_PATTERN = re.compile(r'\d+\s+([\u4e00-\u9fa5]{2,6})')
+# 备用规则3：纯中文姓名，排除常见的非姓名词汇
+NAME_ONLY_PATTERN = re.compile(r'[\u4e00-\u9fa5]{2,6}')
+NON_NAME_WORDS = ("学惠", "报销", "凭证", "遗失", "不补", "退票", "改签", "车站", "检票", "仅供报销使用", "等", "座")
 
 
 def extract_text(json_path):
@@ -13,18 +81,106 @@ def extract_text(json_path):
 
         # 直接从rec_texts字段提取文本
         if "rec_texts" in data:
-            texts = data["rec_texts"]
-            # 过滤空字符串和纯空格文本
-            texts = [txt.strip() for txt in texts if txt.strip()]
+            texts = clean_texts(data["rec_texts"])
     except Exception as e:
-        print(f"读取JSON文件失败: {e}")
+        logger.warning("读取JSON文件失败: %s", e)
 
     return texts
 
 
-def parse_ticket_info(ocr_texts):
+def clean_texts(texts):
     """
-    解析OCR识别的文本
+    过滤空字符串和纯空格文本（供内存中的OCR结果直接使用）
+    """
+    return [txt.strip() for txt in texts if txt.strip()]
+
+
+def empty_fields(ticket_info):
+    """
+    返回解析结果中仍为空的字段名列表
+    """
+    return [field for field in TICKET_FIELDS if not ticket_info.get(field)]
+
+
+def find_stations(txt, station_index=None, train_code="", uncertain=False):
+    """
+    查找文本块中的所有"XX站"，返回按出现位置排序的 [(name, start, end)]；
+    传入 station_index 时用车站名录校验和纠正站名（名录外的站名仍按干扰词过滤），
+    uncertain 表示该文本块 OCR 置信度低，允许在全部站名中纠错
+    """
+    if '站' not in txt:
+        return []
+    if station_index is None:
+        return [(match.group(1), match.start(), match.end())
+                for match in STATION_PATTERN.finditer(txt)
+                if not STATION_INTERFERENCE_PATTERN.search(match.group(1))]
+
+    stations = []
+    for match in STATION_PATTERN.finditer(txt):
+        # 贪婪匹配可能跨过前一个"站"字（"民权站西安站"），按"站"拆开后逐段解析
+        start = match.start()
+        for part in match.group(1).split('站'):
+            if len(part) >= 2:
+                name, _ = station_index.resolve(part, train_code, uncertain)
+                # 名录中的站名（含纠错结果）由名录判定，名录外的站名仍按干扰词过滤
+                if name and (name in station_index.trie or not STATION_INTERFERENCE_PATTERN.search(name)):
+                    stations.append((name, start, start + len(part) + 1))
+            start += len(part) + 1
+    return stations
+
+
+def match_datetime(txt):
+    """
+    按优先级匹配发车时间，返回 "YYYY年MM月DD日 HH:MM"，未匹配返回空串
+    """
+    # 所有时间格式都以"YYYY年MM月"开头
+    if '年' not in txt or '月' not in txt:
+        return ""
+
+    for i, pattern in enumerate(TIME_PATTERNS):
+        match = pattern.search(txt)
+        if match:
+            if i == 0:
+                # 泛化分隔符模式：如 2025年01月18H13:46
+                year_month = match.group(1)
+                day = match.group(2).zfill(2)
+                hour = match.group(3).zfill(2)
+                minute = match.group(4).zfill(2)
+                return f"{year_month}{day}日 {hour}:{minute}"
+            date_part = match.group(1)
+            if i == 3:  # 紧凑型：YYYY年MM月DD日HHMM
+                return f"{date_part} {match.group(2)}:{match.group(3)}"
+            return f"{date_part} {match.group(2).zfill(2)}:{match.group(3).zfill(2)}"
+
+    # 尝试粘连时间（如 2024年02月26014:08 → 应为 2024年02月26日 14:08）
+    sticky_match = STICKY_TIME_PATTERN.search(txt)
+    if not sticky_match:
+        return ""
+    year_month = sticky_match.group(1)
+    time_digits = sticky_match.group(2)
+    minute = sticky_match.group(3).zfill(2)
+
+    day = time_digits[:2]
+    if len(time_digits) == 5:
+        hour = time_digits[-2:]
+        # 检查：hour 是否合理（00~23）
+        if not 0 <= int(hour) <= 23:
+            hour = time_digits[2:4]
+    else:
+        # 4位：DDHH；6位：DDHH + 多余数字
+        hour = time_digits[2:4]
+
+    d = int(day)
+    h = int(hour)
+    if 1 <= d <= 31 and 0 <= h <= 23:
+        return f"{year_month}{day}日 {hour}:{minute}"
+    return ""
+
+
+def parse_ticket_info(ocr_texts, station_index=None, uncertain_texts=()):
+    """
+    解析OCR识别的文本；传入 station_index（station_index.StationIndex）时用车站名录校验和纠正站名，
+    uncertain_texts 为 OCR 置信度低的文本（station_index.low_confidence_texts），只有这些文本中的站名在全部站名中纠错
     """
     ticket_info = {
         "train_code": "",
@@ -41,33 +197,45 @@ def parse_ticket_info(ocr_texts):
         "detection_id": 0
     }
 
-    print(f"OCR独立文本块列表: {ocr_texts}\n")
+    logger.debug("OCR独立文本块列表: %s", ocr_texts)
 
-    # 增加全局解析（跨文本块）
+    # 增加全局解析（跨文本块）；每个文本块的车站只扫描一次，逐块解析时复用
+    block_stations = []
     all_stations_global = []  # [(name, idx)]
+    first_index = {}  # 文本 -> 首次出现的块索引（票价拼接用）
     train_code = ""
     train_index = -1
 
     for idx, txt in enumerate(ocr_texts):
+        first_index.setdefault(txt, idx)
+
         # 提取"XX站"
-        for match in re.finditer(r'([\u4e00-\u9fa5]{2,6})站', txt):
-            name = match.group(1)
-            interference = {"上铺", "中铺", "下铺", "限乘", "当日", "当次", "车", "号", "开", "元", "报销", "使用"}
-            if not any(w in name for w in interference):
+        if station_index is None:
+            stations = find_stations(txt)
+            block_stations.append(stations)
+            for name, _, _ in stations:
                 all_stations_global.append((name, idx))
 
         # 提取车次（首次出现）
         if not train_code:
-            tm = re.search(r'(?<![0-9A-Z])([GDCKTZ]\d{1,4})(?![0-9A-Z])', txt)
+            tm = TRAIN_CODE_PATTERN.search(txt)
             if tm:
                 train_code = tm.group()
                 train_index = idx
 
     ticket_info["train_code"] = train_code
 
+    if station_index is not None:
+        # 名录纠错优先匹配该车次途经的车站，因此在车次确定后再提取车站
+        for idx, txt in enumerate(ocr_texts):
+            stations = find_stations(txt, station_index, train_code, txt in uncertain_texts)
+            block_stations.append(stations)
+            for name, _, _ in stations:
+                all_stations_global.append((name, idx))
+
     # 修复车站解析逻辑 - 当车次出现在所有车站之后时的处理
     if all_stations_global:
-        # 首先去重，但保留顺序
+        # 首先去重，但保留顺序（收集时已按文本块索引有序）
         seen_stations = set()
         unique_stations_with_index = []
         for station in all_stations_global:
@@ -79,9 +247,6 @@ def parse_ticket_info(ocr_texts):
         unique_station_names = [s[0] for s in unique_stations_with_index]
 
         if train_index >= 0:
-            # 按文本块索引对车站排序
-            unique_stations_with_index.sort(key=lambda x: x[1])
-
             # 找出车次前和车次后的车站
             stations_before_train = [s for s in unique_stations_with_index if s[1] < train_index]
             stations_after_train = [s for s in unique_stations_with_index if s[1] > train_index]
@@ -121,35 +286,19 @@ def parse_ticket_info(ocr_texts):
                 ticket_info["departure_station"] = unique_station_names[0]
 
     # 遍历每个独立文本块，逐个匹配对应字段
-    for txt in ocr_texts:
+    for idx, txt in enumerate(ocr_texts):
         if not ticket_info["train_code"] or not (ticket_info["departure_station"] and ticket_info["arrival_station"]):
-            # 1. 查找所有“XX站”车站及其位置
-            stations_in_txt = []
-            for match in re.finditer(r'([\u4e00-\u9fa5]{2,6})站', txt):
-                name = match.group(1)
-                interference = {"上铺", "中铺", "下铺", "限乘", "当日", "当次", "车", "号", "开", "元", "报销", "使用"}
-                if not any(w in name for w in interference):
-                    stations_in_txt.append((name, match.start(), match.end()))
-
-            # 2. 查找车次及其位置
-            train_match = None
-            if not ticket_info["train_code"]:
-                train_match = re.search(r'(?<![0-9])([GDCKTZ]\d{1,4})(?![0-9])', txt)
-                if train_match:
-                    ticket_info["train_code"] = train_match.group(1)
-                    train_start = train_match.start()
-                else:
-                    train_start = -1
-            else:
-                # 车次已知，但仍可尝试定位（用于已有车次但未处理车站的情况）
-                tm = re.search(r'(?<![0-9])([GDCKTZ]\d{1,4})(?![0-9])', txt)
-                train_start = tm.start() if tm else -1
+            # 1. 复用全局解析时找到的车站及其位置
+            stations_in_txt = block_stations[idx]
 
-            # 3. 如果有车站
-            if stations_in_txt:
-                # 按位置排序
-                stations_in_txt.sort(key=lambda x: x[1])
+            # 2. 查找车次及其位置（车次已知时仍定位，用于已有车次但未处理车站的情况）
+            tm = TRAIN_CODE_LOOSE_PATTERN.search(txt)
+            if tm and not ticket_info["train_code"]:
+                ticket_info["train_code"] = tm.group(1)
+            train_start = tm.start() if tm else -1
 
+            # 3. 如果有车站（已按位置排序）
+            if stations_in_txt:
                 if train_start >= 0:
                     # 车次存在：找车次之后的第一个车站 → 到达站
                     arrival_candidates = [s for s in stations_in_txt if s[1] > train_start]
@@ -170,70 +319,7 @@ def parse_ticket_info(ocr_texts):
 
         # 3. 发车时间匹配（支持中文/英文冒号，带或不带“开”字）
         if not ticket_info["datetime"]:
-            # 定义多种时间格式正则（按优先级排序）
-            time_patterns = [
-                r'(\d{4}年\d{1,2}月)(\d{1,2})[^\d:\s]{1,3}?(\d{1,2})[:：](\d{2})开?',
-                # 格式1: "2020年08月29日20：54开" 或 "2020年08月29日20:54开"
-                r'(\d{4}年\d{1,2}月\d{1,2}日)[\s:：]*(\d{1,2})[:：](\d{2})开?',
-                # 格式2: "2020年08月29日 20:54"（有空格）
-                r'(\d{4}年\d{1,2}月\d{1,2}日)\s+(\d{1,2})[:：](\d{2})',
-                # 格式3: 紧凑型 "2020年08月29日2054"
-                r'(\d{4}年\d{1,2}月\d{1,2}日)(\d{2})(\d{2})',
-            ]
-
-            for i, pattern in enumerate(time_patterns):
-                match = re.search(pattern, txt)
-                if match:
-                    if i == 0:
-                        # 泛化分隔符模式：如 2025年01月18H13:46
-                        year_month = match.group(1)
-                        day = match.group(2).zfill(2)
-                        hour = match.group(3).zfill(2)
-                        minute = match.group(4).zfill(2)
-                        ticket_info["datetime"] = f"{year_month}{day}日 {hour}:{minute}"
-                    else:
-                        date_part = match.group(1)
-                        hour = match.group(2).zfill(2)
-                        minute = match.group(3).zfill(2)
-                        if i == 3:  # 紧凑型：YYYY年MM月DDHHMM
-                            hour = match.group(2)
-                            minute = match.group(3)
-                        ticket_info["datetime"] = f"{date_part} {hour}:{minute}"
-                    break
-
-            # 如果没匹配到，尝试粘连时间（如 2024年02月26014:08 → 应为 2024年02月26日 14:08）
-            if not ticket_info["datetime"]:
-                sticky_match = re.search(r'(\d{4}年\d{1,2}月)(\d{4,6}):(\d{2})', txt)
-                if sticky_match:
-                    year_month = sticky_match.group(1)
-                    time_digits = sticky_match.group(2)
-                    minute = sticky_match.group(3).zfill(2)
-
-                    if len(time_digits) == 4:
-                        day = time_digits[:2]
-                        hour = time_digits[2:]
-                    elif len(time_digits) == 5:
-                        day = time_digits[:2]
-                        hour = time_digits[-2:]
-                        # 检查：hour 是否合理（00~23）
-                        if hour.isdigit() and 0 <= int(hour) <= 23:
-                            pass
-                        else:
-                            hour = time_digits[2:4]
-                    elif len(time_digits) == 6:
-                        day = time_digits[:2]
-                        hour = time_digits[2:4]
-                    else:
-                        day = time_digits[:2] if len(time_digits) >= 2 else '01'
-                        hour = time_digits[2:4] if len(time_digits) >= 4 else '00'
-                    # 补零并验证
-                    day = day.zfill(2)
-                    hour = hour.zfill(2)
-
-                    d = int(day)
-                    h = int(hour)
-                    if 1 <= d <= 31 and 0 <= h <= 23:
-                        ticket_info["datetime"] = f"{year_month}{day}日 {hour}:{minute}"
+            ticket_info["datetime"] = match_datetime(txt)
 
             # 如果已提取到时间，跳过后续字段处理
             if ticket_info["datetime"]:
@@ -242,7 +328,7 @@ def parse_ticket_info(ocr_texts):
         # 4. 车厢号+座位号+铺位类型匹配（重点优化：同一文本块拆分多个字段）
         if not (ticket_info["carriage"] and ticket_info["seat_num"] and ticket_info["berth_type"]):
             # 匹配格式：数字车+数字+字母号+铺位类型（如09车14F号上铺、3车02号中铺）
-            combo_match = re.search(r'(\d+)车(\d+[A-F]?)号(上铺|中铺|下铺)?', txt)
+            combo_match = SEAT_COMBO_PATTERN.search(txt) if '车' in txt else None
             if combo_match:
                 # 拆分车厢号、座位号、铺位类型
                 if not ticket_info["carriage"]:
@@ -254,14 +340,8 @@ def parse_ticket_info(ocr_texts):
                 continue
 
         # 处理 03403A → 03车03A号
+        # 走到这里说明第4步的 "XX车XX号" 已经没有命中，直接尝试OCR容错规则
         if not (ticket_info["carriage"] and ticket_info["seat_num"]):
-            # 主规则：03车03A号
-            combo_match = re.search(r'(\d+)车(\d+[A-F]?)号', txt)
-            if combo_match:
-                ticket_info["carriage"] = combo_match.group(1)
-                ticket_info["seat_num"] = combo_match.group(2)
-                continue
-
             # OCR错误规则：如 "03403A" → 假设格式为 XX?XXA（6字符，最后是字母）
             if len(txt) == 6 and txt[-1] in 'ABCDEF' and txt[:2].isdigit():
                 # 尝试跳过第3位（常见OCR把"车"识别为数字）
@@ -270,63 +350,48 @@ def parse_ticket_info(ocr_texts):
                     ticket_info["seat_num"] = txt[3:]
                     continue
 
+            has_seat_mark = '号' in txt
             # 规则2: 泛化OCR错误格式，如 "03+12C号", "05#08A号", "12&01B号"
-            ocr_match = re.search(r'(\d{1,2})[^\u4e00-\u9fa5\dA-Za-z]{1,3}?(\d{1,2}[A-F]?)号', txt)
+            ocr_match = SEAT_OCR_PATTERN.search(txt) if has_seat_mark else None
             if ocr_match:
                 ticket_info["carriage"] = ocr_match.group(1)
                 ticket_info["seat_num"] = ocr_match.group(2)
                 continue
 
-            # 规则3: 单独匹配车厢（如 "03车"）
-            if not ticket_info["carriage"]:
-                carriage_match = re.search(r'(\d+)车', txt)
+            # 规则3: 单独匹配车厢（如 "03车"），兼容只有车厢号的文本块
+            if not ticket_info["carriage"] and '车' in txt:
+                carriage_match = CARRIAGE_PATTERN.search(txt)
                 if carriage_match:
                     ticket_info["carriage"] = carriage_match.group(1)
 
-            # 规则4: 单独匹配座位（如 "12C号"）
-            if not ticket_info["seat_num"]:
-                seat_match = re.search(r'(\d+[A-F]?)号', txt)
+            # 规则4: 单独匹配座位（如 "12C号"），兼容只有座位号的文本块
+            if not ticket_info["seat_num"] and has_seat_mark:
+                seat_match = SEAT_NUM_PATTERN.search(txt)
                 if seat_match:
                     ticket_info["seat_num"] = seat_match.group(1)
 
-        # 5. 单独匹配车厢号（兼容只有车厢号的文本块）
-        if not ticket_info["carriage"]:
-            carriage_match = re.search(r'(\d+)车', txt)
-            if carriage_match:
-                ticket_info["carriage"] = carriage_match.group(1)
-                continue
-
-        # 6. 单独匹配座位号（兼容只有座位号的文本块）
-        if not ticket_info["seat_num"]:
-            # 修改座位号匹配，支持数字+字母的组合
-            seat_match = re.search(r'(\d+[A-F]?)号', txt)
-            if seat_match:
-                ticket_info["seat_num"] = seat_match.group(1)
-                continue
-
-        # 7. 单独匹配铺位类型（兼容只有铺位类型的文本块）
+        # 5. 单独匹配铺位类型（兼容只有铺位类型的文本块）
         if not ticket_info["berth_type"]:
-            berth_types = ["上铺", "中铺", "下铺"]
-            for berth in berth_types:
+            for berth in BERTH_TYPES:
                 if berth in txt:
                     ticket_info["berth_type"] = berth
                     break
             if ticket_info["berth_type"]:
                 continue
 
-        # 8. 票价匹配（处理价格被分割的情况，如['￥443.', '5元']）
+        # 6. 票价匹配（处理价格被分割的情况，如['￥443.', '5元']）
         if not ticket_info["price"]:
             # 检查是否包含价格相关关键词
-            price_related = any(keyword in txt for keyword in ['￥', '元'])
+            price_related = any(keyword in txt for keyword in PRICE_KEYWORDS)
             if price_related:
                 # 如果当前文本块包含价格相关关键词，尝试与前后文本块组合
-                idx = ocr_texts.index(txt)
+                start = first_index[txt]
                 # 尝试组合当前文本块和后续文本块
                 combined_price = txt
-                for i in range(idx + 1, min(idx + 3, len(ocr_texts))):
+                for i in range(start + 1, min(start + 3, len(ocr_texts))):
                     combined_price += ocr_texts[i]
                     # 检查组合后的文本是否符合价格格式
-                    price_match = re.search(r'￥?(\d+\.?\d*)元?', combined_price)
+                    price_match = PRICE_PATTERN.search(combined_price)
                     if price_match:
                         ticket_info["price"] = price_match.group(1)
                         break
@@ -335,7 +400,7 @@ def parse_ticket_info(ocr_texts):
                     continue
 
                 # 单独匹配当前文本块
-                price_match = re.search(r'￥?(\d+\.?\d*)元?', txt)
+                price_match = PRICE_PATTERN.search(txt)
                 if price_match:
                     # 只有当匹配到的数字是完整价格时才使用
                     if '.' in price_match.group(1) or len(price_match.group(1)) > 2:
@@ -343,7 +408,7 @@ def parse_ticket_info(ocr_texts):
                     continue
 
             # 符合小数标准的字段
-            decimal_match = re.search(r'(\d+\.\d+)', txt)
+            decimal_match = DECIMAL_PATTERN.search(txt)
             if decimal_match:
                 val_str = decimal_match.group(1)
                 try:
@@ -353,48 +418,43 @@ def parse_ticket_info(ocr_texts):
                 except ValueError:
                     pass
 
-        # 9. 座位类型匹配（如新车空调硬卧）
+        # 7. 座位类型匹配（如新车空调硬卧）
         if not ticket_info["seat_type"]:
-            seat_types = ['新空调硬座', '新空调硬卧', '新空调软座', '新空调软卧',"一等座", "二等座", "商务座", "特等座", "硬座", "软座", "硬卧", "软卧"]
-            for seat_type in seat_types:
+            for seat_type in SEAT_TYPES:
                 if seat_type in txt:
                     ticket_info["seat_type"] = seat_type
                     break
             if ticket_info["seat_type"]:
                 continue
 
-        # 10. 优惠类型匹配（学生票/儿童票等）
+        # 8. 优惠类型匹配（学生票/儿童票等）
         if not ticket_info["discount_type"]:
-            # 扩展优惠类型关键词，包括"学惠"
-            discount_types = ["学生票", "儿童票", "优惠票", "残疾军人票", "学惠", "学", "惠"]
-            for discount in discount_types:
-                if discount in txt:
-                    ticket_info["discount_type"] = "学生票" if discount == "学惠" or discount == '学' or discount == '惠' else discount
+            for keyword, discount in DISCOUNT_TYPES:
+                if keyword in txt:
+                    ticket_info["discount_type"] = discount
                     break
             if ticket_info["discount_type"]:
                 continue
 
-        # 11. 姓名匹配 - 放在优惠类型之后，避免"学惠"被误识别为姓名
+        # 9. 姓名匹配 - 放在优惠类型之后，避免"学惠"被误识别为姓名
         if not ticket_info["name"]:
             # 主规则：匹配「6位地区码 + 8-10位（数字+*） + 4位校验码」后面的中文
-            name_match = re.search(r'(\d{6})([\d\*]{8,10})([\dXx]{4})([\u4e00-\u9fa5]+)', txt)
+            name_match = NAME_ID_PATTERN.search(txt)
             if name_match:
                 ticket_info["name"] = name_match.group(4).strip()
                 continue
             # 备用规则1：只要有15-17位（数字+*）+ 结尾（数字/X/x），后面的中文都算姓名
-            backup_match1 = re.search(r'[\d\*]{15,17}[\dXx]([\u4e00-\u9fa5]+)', txt)
+            backup_match1 = NAME_ID_LOOSE_PATTERN.search(txt)
             if backup_match1:
                 ticket_info["name"] = backup_match1.group(1).strip()
                 continue
             # 备用规则2：匹配数字+空格+中文姓名的模式（如"5678 张三"）
-            backup_match2 = re.search(r'\d+\s+([\u4e00-\u9fa5]{2,6})', txt)
+            backup_match2 = NAME_AFTER_DIGITS_PATTERN.search(txt)
             if backup_match2:
                 ticket_info["name"] = backup_match2.group(1).strip()
                 continue
             # 备用规则3：匹配纯中文姓名（2-4个中文字符）
-            # 排除常见的非姓名词汇
-            non_name_words = ["学惠", "报销", "凭证", "遗失", "不补", "退票", "改签", "车站", "检票", "仅供报销使用", "等", "座"]
-            if re.fullmatch(r'[\u4e00-\u9fa5]{2,6}', txt) and not any(p in txt for p in non_name_words) and "站" not in txt:
+            if NAME_ONLY_PATTERN.fullmatch(txt) and not any(p in txt for p in NON_NAME_WORDS) and "站" not in txt:
                 ticket_info["name"] = txt
                 continue
 
@@ -0,0 +1,389 @@
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from ticket_parser import clean_texts, parse_ticket_info
+from pipeline_log import setup_logging
+from stage_timer import percentile
+
+logger = logging.getLogger(__name__)
+
+# 单个请求体上限（字节），防止异常上传占满内存
+DEFAULT_MAX_BODY = 20 * 1024 * 1024
+# 延迟统计只保留最近的请求
+LATENCY_WINDOW = 2048
+
+
+class InvalidRequest(Exception):
+    """
+    请求体格式不对：服务返回 400，不计入 failed；识别器的其他异常一律返回 500
+    """
+
+
+class TicketRecognizer:
+    """
+    常驻模型的识别器：YOLO 与 PaddleOCR 只加载一次，一次调用识别一批图片字节，
+    返回每张图片的车票信息列表（无法解码的图片返回 None）
+    """
+
+    def __init__(self, model_path=r'best.pt', ocr_batch_size=1):
+        # 延迟导入：--stub 模式不需要视觉依赖
+        import yolo_ocr
+        from preprocess import decode_bytes
+
+        self._decode = decode_bytes
+        self._yolo_ocr = yolo_ocr
+        self.ocr_batch_size = ocr_batch_size
+        self.yolo_model, self.ocr = yolo_ocr.load_models(model_path)
+
+    def __call__(self, bodies):
+        images = [self._decode(body) for body in bodies]
+        valid = [img for img in images if img is not None]
+        tickets = []
+        if valid:
+            results = self.yolo_model.predict(source=valid, save=False, show=False, verbose=False)
+            if self.ocr_batch_size > 1:
+                detection_ids, records, boxes, _ = self._yolo_ocr.recognize_results_batched(
+                    results, self.ocr, ocr_batch_size=self.ocr_batch_size)
+                tickets = [self._yolo_ocr.parse_crop_records(ids, recs, boxes=bxs)
+                           for ids, recs, bxs in zip(detection_ids, records, boxes)]
+            else:
+                tickets = [self._yolo_ocr.recognize_tickets(result, self.ocr) for result in results]
+
+        tickets_iter = iter(tickets)
+        return [next(tickets_iter) if img is not None else None for img in images]
+
+
+class StubRecognizer:
+    """
+    本地联调用的识别器：不加载模型，请求体为 OCR 文本（JSON 列表或 {"rec_texts": [...]}）时直接解析，
+    其他内容视为没有检测到车票，文本不是字符串列表时该请求返回 InvalidRequest；latency 模拟每批的模型耗时
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+
+    def __call__(self, bodies):
+        if self.latency:
+            time.sleep(self.latency)
+        outputs = []
+        for body in bodies:
+            try:
+                data = json.loads(body)
+            except (UnicodeDecodeError, ValueError):
+                outputs.append([])
+                continue
+            texts = data.get("rec_texts", []) if isinstance(data, dict) else data
+            if not isinstance(texts, list) or not all(isinstance(text, str) for text in texts):
+                outputs.append(InvalidRequest("rec_texts must be a list of strings"))
+                continue
+            outputs.append([parse_ticket_info(clean_texts(texts))])
+        return outputs
+
+
+class MicroBatcher:
+    """
+    把并发请求合并成微批：第一个请求到达后最多等待 max_wait 秒或凑满 max_batch 个再一起识别；
+    等待队列超过 max_queue 时 submit 抛出 asyncio.QueueFull（由调用方返回 503 实现背压）。
+    handler 返回与输入一一对应的结果，某个结果为异常对象时只有对应的请求抛出该异常
+    """
+
+    def __init__(self, handler, max_batch=8, max_wait=0.01, max_queue=64):
+        self.handler = handler
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.max_queue = max_queue
+        self.batches = 0
+        self.batched_items = 0
+        self._queue = None
+        # 模型不保证线程安全，所有批次在同一个线程里串行执行
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="recognizer")
+        self._task = None
+
+    def start(self):
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._executor.shutdown(wait=True)
+
+    @property
+    def queue_depth(self):
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def submit(self, item):
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((item, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            self.batches += 1
+            self.batched_items += len(batch)
+            outputs = await self._recognize(loop, [item for item, _ in batch])
+            for (_, future), output in zip(batch, outputs):
+                if future.done():
+                    continue
+                if isinstance(output, Exception):
+                    future.set_exception(output)
+                else:
+                    future.set_result(output)
+
+    async def _recognize(self, loop, items):
+        """
+        识别一批请求，返回与 items 一一对应的结果；整批失败时逐个重试，
+        只有出错的请求得到异常，同一微批中的其他请求不受影响
+        """
+        try:
+            return await loop.run_in_executor(self._executor, self.handler, items)
+        except Exception as e:
+            if len(items) == 1:
+                logger.exception("识别失败")
+                return [e]
+            logger.warning("批量识别失败，逐个重试: %s", e)
+        outputs = []
+        for item in items:
+            outputs.extend(await self._recognize(loop, [item]))
+        return outputs
+
+
+class TicketService:
+    """
+    asyncio HTTP 服务：
+      POST /recognize  请求体为图片字节，返回 {"tickets": [...]}（每个检测到的车票一个 parse_ticket_info 结果）
+      GET  /health     健康检查
+      GET  /metrics    请求数、拒绝数、批次统计、队列深度、延迟分位数
+    """
+
+    def __init__(self, recognizer, host="127.0.0.1", port=8000, max_batch=8, max_wait=0.01, max_queue=64,
+                 max_body=DEFAULT_MAX_BODY):
+        self.host = host
+        self.port = port
+        self.max_body = max_body
+        self.batcher = MicroBatcher(recognizer, max_batch=max_batch, max_wait=max_wait, max_queue=max_queue)
+        self.started = time.time()
+        self.requests = 0
+        self.rejected = 0
+        self.failed = 0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self._server = None
+
+    async def start(self):
+        self.batcher.start()
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info("车票识别服务已启动: http://%s:%d", self.host, self.port)
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        await self.batcher.stop()
+
+    async def serve_forever(self):
+        await self.start()
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.stop()
+
+    def metrics(self):
+        latencies = list(self.latencies)
+        batches = self.batcher.batches
+        return {
+            "uptime": round(time.time() - self.started, 1),
+            "requests": self.requests,
+            "rejected": self.rejected,
+            "failed": self.failed,
+            "queue_depth": self.batcher.queue_depth,
+            "batches": batches,
+            "mean_batch_size": round(self.batcher.batched_items / batches, 2) if batches else 0.0,
+            "latency_ms": {f"p{pct}": round(percentile(latencies, pct) * 1000, 1) for pct in (50, 95, 99)},
+        }
+
+    async def _route(self, method, path, body):
+        if method == "GET" and path == "/health":
+            return HTTPStatus.OK, {"status": "ok"}
+        if method == "GET" and path == "/metrics":
+            return HTTPStatus.OK, self.metrics()
+        if path != "/recognize":
+            return HTTPStatus.NOT_FOUND, {"error": "not found"}
+        if method != "POST":
+            return HTTPStatus.METHOD_NOT_ALLOWED, {"error": "method not allowed"}
+        if not body:
+            return HTTPStatus.BAD_REQUEST, {"error": "empty body"}
+
+        self.requests += 1
+        start = time.perf_counter()
+        try:
+            tickets = await self.batcher.submit(body)
+        except asyncio.QueueFull:
+            self.rejected += 1
+            return HTTPStatus.SERVICE_UNAVAILABLE, {"error": "busy, retry later"}
+        except InvalidRequest as e:
+            return HTTPStatus.BAD_REQUEST, {"error": str(e)}
+        except Exception as e:
+            self.failed += 1
+            return HTTPStatus.INTERNAL_SERVER_ERROR, {"error": str(e)}
+        self.latencies.append(time.perf_counter() - start)
+        if tickets is None:
+            return HTTPStatus.BAD_REQUEST, {"error": "cannot decode image"}
+        return HTTPStatus.OK, {"tickets": tickets}
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, version = request_line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get("content-length", 0))
+                if length > self.max_body:
+                    await self._respond(writer, HTTPStatus.REQUEST_ENTITY_TOO_LARGE, {"error": "body too large"}, False)
+                    break
+                body = await reader.readexactly(length) if length else b""
+
+                status, payload = await self._route(method, path.split("?", 1)[0], body)
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                await self._respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _respond(writer, status, payload, keep_alive):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        head = (f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+                f"Content-Type: application/json; charset=utf-8\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+
+
+def post_file(host, port, path, timeout=60):
+    """
+    客户端：把文件内容 POST 到 /recognize，返回 (状态码, 响应JSON, 耗时秒)
+    """
+    import http.client
+
+    with open(path, "rb") as f:
+        body = f.read()
+    start = time.perf_counter()
+    conn = http.client.HTTPConnection(host, port, timeout=timeout)
+    try:
+        conn.request("POST", "/recognize", body=body, headers={"Content-Type": "application/octet-stream"})
+        response = conn.getresponse()
+        payload = json.loads(response.read() or b"{}")
+        return response.status, payload, time.perf_counter() - start
+    finally:
+        conn.close()
+
+
+def run_client(host, port, paths, concurrency=8):
+    """
+    并发上传一组文件并输出每个请求的状态和耗时，用于本地联调与压测
+    """
+    lock = threading.Lock()
+    pending = list(paths)
+    latencies = []
+
+    def worker():
+        while True:
+            with lock:
+                if not pending:
+                    return
+                path = pending.pop()
+            status, payload, elapsed = post_file(host, port, path)
+            with lock:
+                latencies.append(elapsed)
+                print(f"{status} {elapsed * 1000:.1f}ms {path}: {json.dumps(payload, ensure_ascii=False)}")
+
+    threads = [threading.Thread(target=worker) for _ in range(max(1, concurrency))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if latencies:
+        print(f"\n{len(latencies)} 个请求，p50 {percentile(latencies, 50) * 1000:.1f}ms，"
+              f"p95 {percentile(latencies, 95) * 1000:.1f}ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="车票识别 HTTP 服务")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = subparsers.add_parser("serve", help="启动服务")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8000)
+    serve_parser.add_argument("--model", default=r'best.pt', help="YOLO 模型路径")
+    serve_parser.add_argument("--max-batch", type=int, default=8, help="每个微批的最大请求数")
+    serve_parser.add_argument("--max-wait-ms", type=float, default=10.0, help="凑批的最长等待时间（毫秒）")
+    serve_parser.add_argument("--max-queue", type=int, default=64, help="等待队列上限，超过时返回 503")
+    serve_parser.add_argument("--ocr-batch-size", type=int, default=1, help="大于 1 时同一微批的裁剪图批量 OCR")
+    serve_parser.add_argument("--stub", action="store_true", help="不加载模型，把请求体当作 OCR 文本直接解析")
+    serve_parser.add_argument("--stub-latency-ms", type=float, default=0.0, help="--stub 模式下模拟的每批耗时")
+    serve_parser.add_argument("-v", "--verbose", action="count", default=0)
+
+    client_parser = subparsers.add_parser("client", help="并发上传文件到服务")
+    client_parser.add_argument("files", nargs="+")
+    client_parser.add_argument("--host", default="127.0.0.1")
+    client_parser.add_argument("--port", type=int, default=8000)
+    client_parser.add_argument("--concurrency", type=int, default=8)
+
+    args = parser.parse_args(argv)
+    if args.command == "client":
+        run_client(args.host, args.port, args.files, args.concurrency)
+        return 0
+
+    setup_logging(args.verbose)
+    if args.stub:
+        recognizer = StubRecognizer(args.stub_latency_ms / 1000.0)
+    else:
+        recognizer = TicketRecognizer(args.model, ocr_batch_size=args.ocr_batch_size)
+    service = TicketService(recognizer, host=args.host, port=args.port, max_batch=args.max_batch,
+                            max_wait=args.max_wait_ms / 1000.0, max_queue=args.max_queue)
+    try:
+        asyncio.run(service.serve_forever())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
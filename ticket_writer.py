@@ -0,0 +1,144 @@
+import os
+import csv
+import json
+import logging
+from collections import Counter
+from ticket_parser import TICKET_FIELDS
+
+logger = logging.getLogger(__name__)
+
+# CSV 列顺序：来源信息 + 车票字段
+CSV_COLUMNS = ("source", "detection_id", "detections", "box") + TICKET_FIELDS
+# 车票字段之外、存在时原样写入 JSONL 的附加信息（级联识别的逐字段置信度、是否升级，重复车票的原件）
+EXTRA_FIELDS = ("confidence", "escalated", "duplicate_of")
+# 续跑清理时代表 CSV 表头的占位来源
+CSV_HEADER_SOURCE = object()
+
+
+def completed_sources(jsonl_path):
+    """
+    读取已有的 JSONL 输出，返回所有车票都已写出的图片路径集合（用于断点续跑）。
+    每条记录带有该图片的检测总数 detections，写出条数不足的图片视为未完成
+    """
+    if not os.path.exists(jsonl_path):
+        return set()
+    expected = {}
+    written = Counter()
+    with open(jsonl_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # 崩溃时最后一行可能只写了一半
+                continue
+            source = record["source"]
+            expected[source] = record["detections"]
+            if record.get("detection_id") is not None:
+                written[source] += 1
+    return {source for source, count in expected.items() if written[source] >= count}
+
+
+def _drop_incomplete(path, completed, source_of):
+    """
+    续跑前移除未完成图片的残留记录（以及崩溃时写了一半的最后一行），避免重跑后出现重复记录
+    """
+    if not os.path.exists(path):
+        return
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        lines = f.readlines()
+    kept = [line for line in lines if line.endswith("\n") and source_of(line) in completed]
+    if len(kept) != len(lines):
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            f.writelines(kept)
+        logger.info("续跑：从 %s 移除 %d 行未完成记录", path, len(lines) - len(kept))
+
+
+def _jsonl_source(line):
+    try:
+        return json.loads(line)["source"]
+    except (json.JSONDecodeError, KeyError):
+        return None
+
+
+def _csv_source(line):
+    # 表头行原样保留
+    if line.startswith(CSV_COLUMNS[0] + ","):
+        return CSV_HEADER_SOURCE
+    return next(csv.reader([line]), [None])[0]
+
+
+class TicketWriter:
+    """
+    流式输出解析结果：每解析出一张车票立即追加一行 JSONL（可选同时写 CSV）并 flush，
+    记录中包含来源图片路径和检测框坐标；没有检测到车票的图片写一条 detection_id 为 null 的占位记录
+    """
+
+    def __init__(self, jsonl_path, csv_path=None, resume=False):
+        self.jsonl_path = jsonl_path
+        self.csv_path = csv_path
+        self.completed = completed_sources(jsonl_path) if resume else set()
+        self.tickets_written = 0
+        if resume:
+            _drop_incomplete(jsonl_path, self.completed, _jsonl_source)
+            if csv_path:
+                _drop_incomplete(csv_path, self.completed | {CSV_HEADER_SOURCE}, _csv_source)
+
+        mode = "a" if resume else "w"
+        directory = os.path.dirname(jsonl_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._jsonl = open(jsonl_path, mode, encoding="utf-8")
+        self._csv_file = None
+        self._csv = None
+        if csv_path:
+            write_header = not resume or not os.path.exists(csv_path) or os.path.getsize(csv_path) == 0
+            self._csv_file = open(csv_path, mode, encoding="utf-8", newline="")
+            self._csv = csv.DictWriter(self._csv_file, fieldnames=CSV_COLUMNS, extrasaction="ignore")
+            if write_header:
+                self._csv.writeheader()
+                self._csv_file.flush()
+
+    def is_done(self, source):
+        return source in self.completed
+
+    def write_ticket(self, source, ticket_info, detections):
+        """
+        写出一张车票；detections 为该图片的检测总数（续跑时用于判断图片是否完整）
+        """
+        record = {"source": source, "detection_id": ticket_info.get("detection_id"), "detections": detections,
+                  "box": ticket_info.get("box")}
+        record.update((field, ticket_info.get(field, "")) for field in TICKET_FIELDS)
+        record.update((field, ticket_info[field]) for field in EXTRA_FIELDS if field in ticket_info)
+        self._write(record)
+        self.tickets_written += 1
+
+    def write_image(self, source, tickets):
+        """
+        写出一张图片的全部车票
+        """
+        if not tickets:
+            self._write({"source": source, "detection_id": None, "detections": 0})
+        for ticket_info in tickets:
+            self.write_ticket(source, ticket_info, len(tickets))
+        self.completed.add(source)
+
+    def _write(self, record):
+        self._jsonl.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._jsonl.flush()
+        if self._csv is not None and record.get("detection_id") is not None:
+            self._csv.writerow(dict(record, box=" ".join(map(str, record["box"] or []))))
+            self._csv_file.flush()
+
+    def close(self):
+        for f in (self._jsonl, self._csv_file):
+            if f is not None:
+                f.close()
+        self._jsonl = None
+        self._csv_file = None
+        self._csv = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -1,80 +1,807 @@
-import cv2
 import os
+import glob
 import json
-from paddleocr import PaddleOCR
-from ultralytics import YOLO
-from ticket_parser import extract_text, parse_ticket_info
+import time
+import logging
+import argparse
+# cv2 / paddleocr / ultralytics 都在首次用到检测或OCR时才导入，只需解析器的调用方不承担它们的加载开销
+from ticket_parser import clean_texts, empty_fields, parse_ticket_info
+from pipeline_log import EventLog, setup_logging
+from stage_timer import StageTimer, peak_rss_mb, profiled
+from ocr_cache import DEFAULT_MAX_BYTES, OCRCache
+from ticket_writer import TicketWriter
+from station_index import STATIONS_PATH, StationIndex, low_confidence_texts
+from preprocess import DEFAULT_CROP_HEIGHT, DEFAULT_CROP_SCALE, REDUCED_SCALES, Preprocessor, resize_to_height
+from layout_parser import parse_ticket_layout
+from cascade import DEFAULT_FAST_CROP_HEIGHT, DEFAULT_MIN_CONFIDENCE, FAST_OCR_OVERRIDES, OCRCascade, field_confidence
+from dedupe import DEFAULT_MAX_DISTANCE, CropHashIndex, TicketDedupeIndex
+from pipeline_stages import ImageItem, bounded, chunked
 
+logger = logging.getLogger(__name__)
+
+# 批处理模式下支持的图片后缀
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+
+# PaddleOCR 配置；与版本号一起构成 OCR 缓存键的一部分，修改后旧缓存自动失效
+OCR_OPTIONS = {
+    "use_doc_orientation_classify": False,
+    "use_doc_unwarping": False,
+    "use_textline_orientation": False,
+    "lang": "ch",
+}
+# 批量 OCR：每次 predict 的最大裁剪图数量与像素总量（约束内存占用）
+DEFAULT_OCR_BATCH_SIZE = 16
+DEFAULT_OCR_MAX_PIXELS = 8_000_000
+
+
+def collect_images(sources):
+    """
+    将目录、通配符或文件列表展开为有序的图片路径列表
+    """
+    if isinstance(sources, str):
+        sources = [sources]
+
+    images = []
+    for source in sources:
+        if os.path.isdir(source):
+            for name in sorted(os.listdir(source)):
+                if name.lower().endswith(IMAGE_EXTENSIONS):
+                    images.append(os.path.join(source, name))
+        elif glob.has_magic(source):
+            images.extend(p for p in sorted(glob.glob(source)) if p.lower().endswith(IMAGE_EXTENSIONS))
+        elif os.path.isfile(source):
+            images.append(source)
+        else:
+            logger.warning("跳过不存在的输入: %s", source)
+
+    # 去重，但保留顺序
+    return list(dict.fromkeys(images))
+
+
+def load_ocr(**overrides):
+    """
+    初始化 PaddleOCR 实例；overrides 用于不影响识别结果的运行参数（如 cpu_threads）
+    """
+    from paddleocr import PaddleOCR
+    return PaddleOCR(**dict(OCR_OPTIONS, **overrides))
+
+
+def load_models(model_path=r'best.pt', with_ocr=True):
+    """
+    加载 YOLO 与 PaddleOCR 模型（整个批次只加载一次）；
+    OCR 交给进程池时 with_ocr=False，主进程不再加载 PaddleOCR
+    """
+    from ultralytics import YOLO
 
-def process_ticket_recognition():
-    # 确保输出目录存在
-    os.makedirs("output", exist_ok=True)
     # 初始化 YOLO 模型
-    yolo_model = YOLO(model=r'best.pt')
-    # 使用 YOLO 进行车票提取
-    yolo_results = yolo_model.predict(source=r'222.png',save=False,show=False)
+    yolo_model = YOLO(model=model_path)
     # 初始化 PaddleOCR 实例
-    ocr = PaddleOCR(use_doc_orientation_classify=False, use_doc_unwarping=False, use_textline_orientation=False, lang='ch')
-    # 用于存储所有解析结果
-    all_ticket_info = []
-
-    # 处理 YOLO 的检测结果
-    for result in yolo_results:
-        # 获取原始图像
-        orig_img = result.orig_img
-        # 获取检测框信息
-        boxes = result.boxes
-        if boxes is not None:
-            # 遍历每个检测到的目标
-            for i, box in enumerate(boxes):
-                # 获取边界框坐标
-                xyxy = box.xyxy[0].cpu().numpy()
-                x1, y1, x2, y2 = map(int, xyxy)
-                # 裁剪检测区域
-                crop_img = orig_img[y1:y2, x1:x2]
-                # 临时保存裁剪的图像用于OCR
-                temp_path = f"temp_crop_{i}.png"
-                cv2.imwrite(temp_path, crop_img)
-                # 对裁剪区域执行 OCR
-                ocr_result = ocr.predict(input=temp_path)
-                print(f"检测目标 {i} 的OCR结果:")
-                for res in ocr_result:
-                    res.print()
-                    # 保存原始OCR结果到JSON
-                    json_filename = f"output/temp_crop_{i}_ocr.json"
-                    res.save_to_json(json_filename)
-
-                # 清理临时文件
-                if os.path.exists(temp_path):
-                    os.remove(temp_path)
-
-                # 从JSON文件中提取文本
-                json_path = f"output/temp_crop_{i}_ocr.json"
-                if os.path.exists(json_path):
-                    print(f"从JSON文件读取: {json_path}")
-
-                    # 从JSON文件中提取文本
-                    ocr_texts = extract_text(json_path)
-
-                    # 解析车票信息
-                    ticket_info = parse_ticket_info(ocr_texts)
-                    ticket_info["detection_id"] = i
-                    all_ticket_info.append(ticket_info)
-
-                    # 打印解析结果
-                    print(f"\n检测目标 {i} 解析结果:")
-                    for key, value in ticket_info.items():
-                        print(f"  {key}: {value}")
-                    print()
+    ocr = load_ocr() if with_ocr else None
+    return yolo_model, ocr
+
+
+def ocr_result_to_record(res):
+    """
+    将 PaddleOCR 的结果对象转为普通字典，只保留解析需要的 rec_texts/rec_scores/rec_boxes
+    """
+    record = {}
+    for key in ("rec_texts", "rec_scores", "rec_boxes"):
+        value = res.get(key)
+        if value is None:
+            value = []
+        record[key] = value.tolist() if hasattr(value, "tolist") else list(value)
+    return record
+
+
+def ocr_crop(ocr, crop_img):
+    """
+    直接把裁剪区域（numpy 视图）送入 PaddleOCR，不经过临时文件，返回结果对象列表
+    """
+    return ocr.predict(input=crop_img)
+
+
+def dump_crop(res, crop_img, dump_prefix):
+    """
+    调试模式：把裁剪图和原始OCR结果保存为 {dump_prefix}.png / {dump_prefix}_ocr.json
+    """
+    import cv2
+
+    os.makedirs(os.path.dirname(dump_prefix) or ".", exist_ok=True)
+    cv2.imwrite(f"{dump_prefix}.png", crop_img)
+    res.save_to_json(f"{dump_prefix}_ocr.json")
+
+
+def ocr_to_record(ocr, crop_img, dump_prefix=None, timer=None):
+    """
+    对单个裁剪图执行 OCR 并合并为一条记录；dump_prefix 不为空时（调试模式）
+    把裁剪图和原始OCR结果保存为 {dump_prefix}.png / {dump_prefix}_ocr.json
+    """
+    if timer is None:
+        timer = StageTimer()
+    with timer.stage("ocr"):
+        ocr_result = ocr_crop(ocr, crop_img)
+    record = {"rec_texts": [], "rec_scores": [], "rec_boxes": []}
+    for res in ocr_result:
+        with timer.stage("serialize"):
+            for key, value in ocr_result_to_record(res).items():
+                record[key].extend(value)
+
+        if dump_prefix:
+            # 调试模式：保存裁剪图和原始OCR结果
+            with timer.stage("dump"):
+                dump_crop(res, crop_img, dump_prefix)
+    return record
+
+
+def ocr_cache_version():
+    """
+    OCR 缓存版本：paddleocr 版本号 + OCR_OPTIONS，修改任一项后旧缓存自动失效；
+    版本号从安装元数据读取，不需要导入 paddleocr
+    """
+    from importlib import metadata
+
+    try:
+        version = metadata.version("paddleocr")
+    except metadata.PackageNotFoundError:
+        version = "unknown"
+    return f"paddleocr-{version}|" + json.dumps(OCR_OPTIONS, sort_keys=True)
+
+
+def open_ocr_cache(path, max_bytes=DEFAULT_MAX_BYTES):
+    """
+    打开与当前 OCR 配置绑定的结果缓存
+    """
+    return OCRCache(path, max_bytes=max_bytes, version=ocr_cache_version())
+
+
+def fast_cache_version(ocr_cache):
+    """
+    级联快速阶段的缓存版本：在 ocr_cache 的版本后加上 FAST_OCR_OVERRIDES，快速结果与完整配置的结果互不命中
+    """
+    return f"{ocr_cache.version}|fast|" + json.dumps(FAST_OCR_OVERRIDES, sort_keys=True)
+
+
+def crop_detections(result, prepared=None):
+    """
+    按 YOLO 检测框裁剪原图，返回 [(detection_id, 裁剪图, [x1, y1, x2, y2])]；裁剪图是 numpy 视图，不复制像素。
+    prepared 为预处理后的图片（preprocess.PreparedImage）时，检测框映射回裁剪分辨率后裁剪并缩放
+    """
+    if prepared is not None:
+        return prepared.crop(result)
+    crops = []
+    # 获取检测框信息
+    boxes = result.boxes
+    if boxes is None:
+        return crops
+    # 获取原始图像
+    orig_img = result.orig_img
+    for i, box in enumerate(boxes):
+        # 获取边界框坐标
+        xyxy = box.xyxy[0].cpu().numpy()
+        x1, y1, x2, y2 = map(int, xyxy)
+        crops.append((i, orig_img[y1:y2, x1:x2], [x1, y1, x2, y2]))
+    return crops
+
+
+def dump_prefix(result, detection_id):
+    """
+    调试文件前缀：以图片名区分，避免多张图片/多个进程互相覆盖
+    """
+    stem = os.path.splitext(os.path.basename(getattr(result, "path", "") or "image"))[0]
+    return f"output/{stem}_crop_{detection_id}"
+
+
+def plan_ocr_batches(crop_imgs, batch_size, max_pixels):
+    """
+    把裁剪图按数量（batch_size）和像素总量（max_pixels）切分为若干批，返回下标列表；
+    单张超过像素预算的裁剪图单独成批
+    """
+    batches = []
+    current = []
+    pixels = 0
+    for j, crop_img in enumerate(crop_imgs):
+        size = crop_img.shape[0] * crop_img.shape[1]
+        if current and (len(current) >= batch_size or pixels + size > max_pixels):
+            batches.append(current)
+            current = []
+            pixels = 0
+        current.append(j)
+        pixels += size
+    if current:
+        batches.append(current)
+    return batches
+
+
+def ocr_batch_to_records(ocr, crop_imgs, dump_prefixes=None, batch_size=DEFAULT_OCR_BATCH_SIZE,
+                         max_pixels=DEFAULT_OCR_MAX_PIXELS, timer=None):
+    """
+    把多个裁剪图按批送入 PaddleOCR（一次 predict 调用识别一批），按输入顺序返回记录列表
+    """
+    if timer is None:
+        timer = StageTimer()
+    if dump_prefixes is None:
+        dump_prefixes = [None] * len(crop_imgs)
+    records = [None] * len(crop_imgs)
+    for indices in plan_ocr_batches(crop_imgs, batch_size, max_pixels):
+        with timer.stage("ocr"):
+            ocr_result = list(ocr.predict(input=[crop_imgs[j] for j in indices]))
+        # 批量输入时每张裁剪图对应一个结果对象
+        for j, res in zip(indices, ocr_result):
+            with timer.stage("serialize"):
+                records[j] = ocr_result_to_record(res)
+            if dump_prefixes[j]:
+                with timer.stage("dump"):
+                    dump_crop(res, crop_imgs[j], dump_prefixes[j])
+    return records
+
+
+def recognize_crops(crops, ocr, dump_prefixes=None, timer=None, ocr_cache=None, ocr_pool=None,
+                    ocr_batch_size=1, ocr_max_pixels=DEFAULT_OCR_MAX_PIXELS, crop_index=None, crop_sources=None,
+                    cache_version=None):
+    """
+    对 [(crop_id, 裁剪图)] 执行 OCR，按输入顺序返回记录列表。
+    先查 ocr_cache，再查 crop_index（dedupe.CropHashIndex，按感知哈希复用近重复裁剪图的记录，
+    同一次调用中彼此近重复的裁剪图只识别一张），
+    未命中的裁剪图交给 ocr_pool（多进程）、按 ocr_batch_size 批量识别或逐个识别；
+    只有实际识别的裁剪图写入 ocr_cache，复用近重复记录的裁剪图不以自身内容为键写入缓存；
+    crop_sources 为与 crops 对应的 [(图片路径, detection_id)] 时在 ocr_cache 中记录图片到缓存记录的映射
+    （复用的记录映射到原裁剪图的缓存键）；cache_version 不为空时以该版本代替缓存自身的版本计算缓存键
+    """
+    if timer is None:
+        timer = StageTimer()
+    if dump_prefixes is None:
+        dump_prefixes = [None] * len(crops)
+    records = [None] * len(crops)
+    cache_keys = [None] * len(crops)
+    if ocr_cache is not None:
+        with timer.stage("cache"):
+            for j, (_, crop_img) in enumerate(crops):
+                cache_keys[j] = ocr_cache.key(crop_img, cache_version)
+                records[j] = ocr_cache.get(cache_keys[j])
+
+    missing = [j for j, record in enumerate(records) if record is None]
+    if ocr_cache is not None and crop_sources:
+        ocr_cache.add_sources([(source, detection_id, cache_keys[j])
+                               for j, (source, detection_id) in enumerate(crop_sources) if records[j] is not None])
+    if not missing:
+        return records
+    uncached = missing
+    source_keys = list(cache_keys)
+
+    owners = {}  # 条目编号 → 本次调用中登记该条目的裁剪图下标
+    aliases = {}  # 裁剪图下标 → 与其近重复、本次调用中识别的裁剪图下标
+    if crop_index is not None:
+        with timer.stage("dedupe"):
+            for j in missing:
+                crop_img = crops[j][1]
+                crop_hash = crop_index.hash(crop_img)
+                entry_id = crop_index.find(crop_hash, crop_img.shape)
+                if entry_id in owners:
+                    aliases[j] = owners[entry_id]
+                    source_keys[j] = cache_keys[owners[entry_id]]
+                elif entry_id is not None and crop_index.record(entry_id) is not None:
+                    records[j] = crop_index.record(entry_id)
+                    source_keys[j] = crop_index.cache_key(entry_id)
+                    crop_index.hits += 1
                 else:
-                    print(f"未找到OCR JSON文件: {json_path}")
+                    owners[crop_index.add(crop_hash, crop_img.shape)] = j
+                    crop_index.misses += 1
+        crop_index.hits += len(aliases)
+        missing = list(owners.values())
 
-    # 保存结构化车票信息到JSON
-    with open("ticket_structured_info.json", "w", encoding="utf-8") as f:
-        json.dump(all_ticket_info, f, ensure_ascii=False, indent=2)
+    missing_prefixes = [dump_prefixes[j] for j in missing]
+    if ocr_pool is not None:
+        with timer.stage("ocr"):
+            recognized = ocr_pool.map([crops[j] for j in missing], missing_prefixes)
+    elif ocr_batch_size > 1:
+        recognized = ocr_batch_to_records(ocr, [crops[j][1] for j in missing], missing_prefixes,
+                                          batch_size=ocr_batch_size, max_pixels=ocr_max_pixels, timer=timer)
+    else:
+        recognized = [ocr_to_record(ocr, crops[j][1], dump_prefix=prefix, timer=timer)
+                      for j, prefix in zip(missing, missing_prefixes)]
+    for j, record in zip(missing, recognized):
+        records[j] = record
+    for entry_id, j in owners.items():
+        crop_index.set(entry_id, records[j], cache_keys[j])
+    for j, owner in aliases.items():
+        records[j] = records[owner]
 
-    print(f"\n所有解析结果已保存到 ticket_structured_info.json")
+    if ocr_cache is not None:
+        with timer.stage("cache"):
+            for j in missing:
+                ocr_cache.put(cache_keys[j], records[j])
+            if crop_sources:
+                ocr_cache.add_sources([(*crop_sources[j], source_keys[j]) for j in uncached
+                                       if source_keys[j] is not None])
+    return records
+
+
+def parse_crop_records(detection_ids, records, timer=None, boxes=None, station_index=None, layout=False):
+    """
+    逐个解析 OCR 记录，返回车票信息列表；传入 boxes 时把检测框坐标写入 box 字段，
+    传入 station_index 时用车站名录校验和纠正站名；layout 为 True 时按文本框位置解析（layout_parser）
+    """
+    if timer is None:
+        timer = StageTimer()
+    tickets = []
+    for j, (i, record) in enumerate(zip(detection_ids, records)):
+        logger.debug("检测目标 %d 的OCR结果: %s", i, record)
+
+        # 解析车票信息
+        with timer.stage("parse"):
+            if layout:
+                ticket_info = parse_ticket_layout(record, station_index)
+            else:
+                uncertain_texts = low_confidence_texts(record) if station_index is not None else ()
+                ticket_info = parse_ticket_info(clean_texts(record["rec_texts"]), station_index, uncertain_texts)
+        ticket_info["detection_id"] = i
+        if boxes is not None:
+            ticket_info["box"] = boxes[j]
+        tickets.append(ticket_info)
+
+        logger.debug("检测目标 %d 解析结果: %s", i, ticket_info)
+    return tickets
+
+
+def cascade_tickets(crops, boxes, ocr, cascade, timer=None, ocr_cache=None, ocr_pool=None, station_index=None,
+                    crop_index=None, source=None, layout=False, dump_prefixes=None):
+    """
+    级联识别 [(detection_id, 裁剪图)]：同一张图片的裁剪图缩小后先用快速配置批量 OCR，
+    必填字段缺失或置信度不足的车票再用 ocr（或 ocr_pool）按原尺寸识别。
+    每张车票带 confidence（逐字段置信度）和 escalated（是否升级）字段。
+    快速结果以 fast_cache_version 为版本写入 ocr_cache，不会被当作完整配置的结果命中；
+    source 为图片路径时每个检测目标映射到最终采用的记录（升级的车票映射到重型结果）。只有重型结果写入 crop_index；
+    dump_prefixes 不为空时快速阶段的调试文件以 {dump_prefix}_fast 为前缀，升级的车票另存重型结果
+    """
+    if timer is None:
+        timer = StageTimer()
+    detection_ids = [i for i, _ in crops]
+    with timer.stage("crop"):
+        # 快速阶段只缩小不放大：放大会抵消快速配置的速度优势
+        fast_crops = [(i, resize_to_height(crop_img, cascade.fast_crop_height, upscale=False)) for i, crop_img in crops]
+    fast_prefixes = [f"{prefix}_fast" for prefix in dump_prefixes] if dump_prefixes else None
+    fast_records = recognize_crops(fast_crops, cascade.fast_ocr, dump_prefixes=fast_prefixes, timer=timer,
+                                   ocr_cache=ocr_cache, ocr_batch_size=len(fast_crops),
+                                   crop_sources=[(source, i) for i in detection_ids] if source else None,
+                                   cache_version=fast_cache_version(ocr_cache) if ocr_cache is not None else None)
+    tickets = parse_crop_records(detection_ids, fast_records, timer, boxes=boxes, station_index=station_index,
+                                 layout=layout)
+
+    escalate = []
+    for j, (ticket_info, record) in enumerate(zip(tickets, fast_records)):
+        ticket_info["confidence"] = field_confidence(ticket_info, record)
+        ticket_info["escalated"] = False
+        reasons = cascade.should_escalate(ticket_info, ticket_info["confidence"])
+        if reasons:
+            logger.debug("检测目标 %d 升级到重型OCR: %s", detection_ids[j], reasons)
+            escalate.append(j)
+
+    if escalate:
+        heavy_records = recognize_crops([crops[j] for j in escalate], ocr,
+                                        dump_prefixes=[dump_prefixes[j] for j in escalate] if dump_prefixes else None,
+                                        timer=timer, ocr_cache=ocr_cache, ocr_pool=ocr_pool, crop_index=crop_index,
+                                        crop_sources=[(source, detection_ids[j]) for j in escalate] if source else None)
+        heavy_tickets = parse_crop_records([detection_ids[j] for j in escalate], heavy_records, timer,
+                                           boxes=[boxes[j] for j in escalate], station_index=station_index,
+                                           layout=layout)
+        for j, ticket_info, record in zip(escalate, heavy_tickets, heavy_records):
+            ticket_info["confidence"] = field_confidence(ticket_info, record)
+            ticket_info["escalated"] = True
+            tickets[j] = ticket_info
+    cascade.record(len(tickets), len(escalate))
+    return tickets
+
+
+def recognize_tickets(result, ocr, debug_dump=False, timer=None, ocr_cache=None, ocr_pool=None, station_index=None,
+                      prepared=None, cascade=None, crop_index=None, layout=False):
+    """
+    对单张图片的 YOLO 检测结果逐个裁剪、OCR 并解析，返回车票信息列表。
+    裁剪图像在内存中直接交给 OCR；debug_dump 为 True 时才把裁剪图和OCR结果写入 output/；
+    传入 timer 时把 crop/cache/ocr/serialize/dump/parse 各阶段耗时记入当前图片；
+    传入 ocr_cache 时先按裁剪图内容查缓存，命中则跳过 OCR；
+    传入 ocr_pool 时同一张图片的多个裁剪图并行识别；
+    传入 prepared（preprocess.PreparedImage）时按预处理的分辨率裁剪；
+    传入 cascade（cascade.OCRCascade）时先用快速配置识别，只有低置信度的车票交给 ocr 重新识别；
+    传入 crop_index（dedupe.CropHashIndex）时近重复的裁剪图复用此前的OCR记录；
+    layout 为 True 时用版面解析（layout_parser.parse_ticket_layout）代替按文本顺序解析
+    """
+    if timer is None:
+        timer = StageTimer()
+
+    with timer.stage("crop"):
+        detections = crop_detections(result, prepared)
+    if not detections:
+        return []
+
+    crops = [(i, crop_img) for i, crop_img, _ in detections]
+    dump_prefixes = [dump_prefix(result, i) for i, _ in crops] if debug_dump else None
+    return recognize_crop_tickets(crops, [box for _, _, box in detections], ocr, dump_prefixes=dump_prefixes,
+                                  timer=timer, ocr_cache=ocr_cache, ocr_pool=ocr_pool, station_index=station_index,
+                                  cascade=cascade, crop_index=crop_index, source=getattr(result, "path", None),
+                                  layout=layout)
+
+
+def recognize_crop_tickets(crops, boxes, ocr, dump_prefixes=None, timer=None, ocr_cache=None, ocr_pool=None,
+                           station_index=None, cascade=None, crop_index=None, source=None, layout=False):
+    """
+    对一张图片已裁剪好的 [(detection_id, 裁剪图)] 执行 OCR 并解析（或级联识别），返回车票信息列表；
+    source 为图片路径时在 ocr_cache 中记录该图片各检测目标对应的缓存记录
+    """
+    if cascade is not None:
+        return cascade_tickets(crops, boxes, ocr, cascade, timer=timer, ocr_cache=ocr_cache, ocr_pool=ocr_pool,
+                               station_index=station_index, crop_index=crop_index, source=source, layout=layout,
+                               dump_prefixes=dump_prefixes)
+    records = recognize_crops(crops, ocr, dump_prefixes=dump_prefixes, timer=timer, ocr_cache=ocr_cache,
+                              ocr_pool=ocr_pool, crop_index=crop_index,
+                              crop_sources=[(source, i) for i, _ in crops] if source else None)
+    return parse_crop_records([i for i, _ in crops], records, timer, boxes=boxes, station_index=station_index,
+                              layout=layout)
+
+
+def recognize_results_batched(results, ocr, debug_dump=False, ocr_cache=None, ocr_pool=None,
+                              ocr_batch_size=DEFAULT_OCR_BATCH_SIZE, ocr_max_pixels=DEFAULT_OCR_MAX_PIXELS,
+                              prepared=None, crop_index=None):
+    """
+    收集一批 YOLO 结果中所有图片的裁剪图统一批量 OCR，结果按 (图片, detection_id) 映射回去；
+    prepared 为与 results 对应的预处理图片列表时按预处理的分辨率裁剪。
+    返回 (每张图片的 detection_id 列表, 每张图片的记录列表, 每张图片的检测框列表, 每张图片按像素分摊的阶段耗时)
+    """
+    batch_timer = StageTimer()
+    groups = [[] for _ in results]  # 每张图片的 [(detection_id, 裁剪图)]
+    boxes = [[] for _ in results]
+    with batch_timer.stage("crop"):
+        for k, result in enumerate(results):
+            for i, crop_img, box in crop_detections(result, prepared[k] if prepared else None):
+                groups[k].append((i, crop_img))
+                boxes[k].append(box)
+
+    dump_prefixes = [[dump_prefix(results[k], i) for i, _ in group] for k, group in enumerate(groups)] \
+        if debug_dump else None
+    records_per_image, shares = recognize_crop_groups(groups, ocr, dump_prefixes=dump_prefixes, ocr_cache=ocr_cache,
+                                                      ocr_pool=ocr_pool, ocr_batch_size=ocr_batch_size,
+                                                      ocr_max_pixels=ocr_max_pixels, crop_index=crop_index,
+                                                      batch_timer=batch_timer,
+                                                      sources=[getattr(result, "path", None) for result in results])
+    detection_ids = [[i for i, _ in group] for group in groups]
+    return detection_ids, records_per_image, boxes, shares
+
+
+def recognize_crop_groups(groups, ocr, dump_prefixes=None, ocr_cache=None, ocr_pool=None,
+                          ocr_batch_size=DEFAULT_OCR_BATCH_SIZE, ocr_max_pixels=DEFAULT_OCR_MAX_PIXELS,
+                          crop_index=None, batch_timer=None, sources=None):
+    """
+    把多张图片的裁剪图（groups 为每张图片的 [(detection_id, 裁剪图)]）合并后统一批量 OCR，
+    返回 (每张图片的记录列表, 每张图片按裁剪图像素占比分摊的阶段耗时)；batch_timer 中已有的耗时一并分摊；
+    sources 为各图片路径时在 ocr_cache 中记录图片到缓存记录的映射
+    """
+    if batch_timer is None:
+        batch_timer = StageTimer()
+    crops = [((k, i), crop_img) for k, group in enumerate(groups) for i, crop_img in group]
+    flat_prefixes = [prefix for prefixes in dump_prefixes for prefix in prefixes] if dump_prefixes else None
+    crop_sources = [(sources[k], i) for (k, i), _ in crops] if sources else None
+    records = recognize_crops(crops, ocr, dump_prefixes=flat_prefixes, timer=batch_timer, ocr_cache=ocr_cache,
+                              ocr_pool=ocr_pool, ocr_batch_size=ocr_batch_size, ocr_max_pixels=ocr_max_pixels,
+                              crop_index=crop_index, crop_sources=crop_sources)
+
+    records_per_image = [[] for _ in groups]
+    pixels = [0] * len(groups)
+    for ((k, _), crop_img), record in zip(crops, records):
+        records_per_image[k].append(record)
+        pixels[k] += crop_img.shape[0] * crop_img.shape[1]
+
+    # 批量识别无法区分单张图片的耗时，按裁剪图像素占比分摊
+    durations = batch_timer.end_image()
+    durations.pop("total")
+    total_pixels = sum(pixels) or 1
+    shares = [{stage: seconds * pixels[k] / total_pixels for stage, seconds in durations.items()}
+              for k in range(len(groups))]
+    return records_per_image, shares
+
+
+def decode_stage(images, preprocessor=None):
+    """
+    流水线第一阶段：为每张图片创建 ImageItem；传入 preprocessor 时按其配置解码（否则由 YOLO 读取文件）
+    """
+    for image_path in images:
+        item = ImageItem(image_path)
+        if preprocessor is not None:
+            item.prepared = preprocessor.load(image_path)
+            item.timer.add("decode", item.prepared.decode_seconds)
+        yield item
+
+
+def detect_stage(items, yolo_model, batch_size=8):
+    """
+    按 batch_size 张一组送入 YOLO（stream=True，ultralytics 逐张产出结果而不是先收集整批的 Results 列表）
+    """
+    for batch in chunked(items, batch_size):
+        source = [item.prepared.detect_img if item.prepared else item.path for item in batch]
+        results = yolo_model.predict(source=source, stream=True, save=False, show=False, verbose=False)
+        for item, result in zip(batch, results):
+            if item.prepared:
+                # 传入数组时 ultralytics 使用占位文件名，改回原图路径供调试输出使用
+                result.path = item.path
+            # YOLO 按批推理，单图检测耗时取 ultralytics 记录的 speed（毫秒）
+            item.timer.add("detect", sum(getattr(result, "speed", {}).values()) / 1000.0)
+            item.result = result
+            yield item
+
+
+def crop_stage(items, debug_dump=False):
+    """
+    裁剪检测框后立即释放 YOLO 结果和解码的整图：裁剪图是整图的 numpy 视图，复制后整图才能被回收
+    """
+    for item in items:
+        with item.timer.stage("crop"):
+            detections = crop_detections(item.result, item.prepared)
+            item.crops = [(i, crop_img.copy() if crop_img.base is not None else crop_img)
+                          for i, crop_img, _ in detections]
+        item.boxes = [box for _, _, box in detections]
+        if debug_dump:
+            item.dump_prefixes = [dump_prefix(item.result, i) for i, _ in item.crops]
+        item.result = item.prepared = None
+        yield item
+
+
+def ocr_stage(items, ocr, batch_size=8, ocr_cache=None, ocr_pool=None, ocr_batch_size=1,
+              ocr_max_pixels=DEFAULT_OCR_MAX_PIXELS, station_index=None, cascade=None, crop_index=None, layout=False):
+    """
+    识别每张图片的裁剪图：ocr_batch_size > 1 时把 batch_size 张图片的裁剪图合并批量 OCR（耗时按像素分摊）；
+    cascade 不为空时逐张级联识别并直接产出车票（级联中 OCR 与解析交替进行）
+    """
+    if cascade is None and ocr_batch_size > 1:
+        for group in chunked(items, batch_size):
+            dump_prefixes = [item.dump_prefixes for item in group] if group[0].dump_prefixes is not None else None
+            records, shares = recognize_crop_groups([item.crops for item in group], ocr, dump_prefixes=dump_prefixes,
+                                                    ocr_cache=ocr_cache, ocr_pool=ocr_pool,
+                                                    ocr_batch_size=ocr_batch_size, ocr_max_pixels=ocr_max_pixels,
+                                                    crop_index=crop_index, sources=[item.path for item in group])
+            for item, item_records, share in zip(group, records, shares):
+                item.records = item_records
+                for stage, seconds in share.items():
+                    item.timer.add(stage, seconds)
+                yield item
+        return
+
+    for item in items:
+        if cascade is not None:
+            item.tickets = recognize_crop_tickets(item.crops, item.boxes, ocr, timer=item.timer, ocr_cache=ocr_cache,
+                                                  ocr_pool=ocr_pool, station_index=station_index, cascade=cascade,
+                                                  crop_index=crop_index, source=item.path, layout=layout,
+                                                  dump_prefixes=item.dump_prefixes) if item.crops else []
+        else:
+            item.records = recognize_crops(item.crops, ocr, dump_prefixes=item.dump_prefixes, timer=item.timer,
+                                           ocr_cache=ocr_cache, ocr_pool=ocr_pool, crop_index=crop_index,
+                                           crop_sources=[(item.path, i) for i, _ in item.crops])
+        yield item
+
+
+def parse_stage(items, station_index=None, layout=False):
+    """
+    解析 OCR 记录为车票信息，之后释放裁剪图和记录
+    """
+    for item in items:
+        if item.tickets is None:
+            item.tickets = parse_crop_records([i for i, _ in item.crops], item.records, item.timer, boxes=item.boxes,
+                                              station_index=station_index, layout=layout)
+        item.crops = item.records = None
+        yield item
+
+
+def process_ticket_recognition(source=r'222.png', model_path=r'best.pt', debug_dump=False, ocr_cache=None,
+                               ocr_pool=None, station_index=None, preprocessor=None, cascade=None, crop_index=None,
+                               output_path="ticket_structured_info.jsonl", csv_path=None, resume=False, layout=False):
+    """
+    识别单个输入（图片，或由 YOLO 逐张读取的目录/视频）：每张图片解析完成后立即通过 TicketWriter
+    追加写入 output_path（JSONL，可选同时写 csv_path），中途崩溃不会丢失已解析的车票；
+    resume 为 True 时跳过输出中已完成的图片
+    """
+    writer = TicketWriter(output_path, csv_path=csv_path, resume=resume)
+    try:
+        if writer.is_done(source):
+            logger.info("%s 已在 %s 中完成，跳过", source, output_path)
+            return
+        yolo_model, ocr = load_models(model_path, with_ocr=ocr_pool is None)
+        # 使用 YOLO 进行车票提取
+        prepared = preprocessor.load(source) if preprocessor is not None else None
+        # stream=True：目录或视频作为输入时逐张处理，不会先把所有 Results 留在内存中
+        yolo_results = yolo_model.predict(source=prepared.detect_img if prepared else source,
+                                          stream=True, save=False, show=False, verbose=False)
+        for result in yolo_results:
+            # 预处理后送入 YOLO 的是数组，结果中没有原图路径
+            image_path = source if prepared is not None else result.path
+            if writer.is_done(image_path):
+                continue
+            writer.write_image(image_path, recognize_tickets(result, ocr, debug_dump=debug_dump, ocr_cache=ocr_cache,
+                                                             ocr_pool=ocr_pool, station_index=station_index,
+                                                             prepared=prepared, cascade=cascade,
+                                                             crop_index=crop_index, layout=layout))
+    finally:
+        writer.close()
+    logger.info("共 %d 张车票，解析结果已写入 %s", writer.tickets_written, output_path)
+
+
+def process_ticket_batch(sources, model_path=r'best.pt', output_dir="output/batch", batch_size=8, debug_dump=False,
+                         events_path=None, timer=None, ocr_cache=None, ocr_pool=None, ocr_batch_size=1,
+                         ocr_max_pixels=DEFAULT_OCR_MAX_PIXELS, csv_path=None, resume=False, station_index=None,
+                         preprocessor=None, cascade=None, crop_index=None, ticket_index=None, prefetch=None,
+                         layout=False):
+    """
+    批量识别：模型只加载一次，按 batch_size 分批送入 YOLO。
+    图片依次流经 解码 → 检测 → 裁剪 → OCR → 解析 → 写出 各阶段（生成器），每个阶段只持有当前批次，
+    YOLO 结果和整图在裁剪后即释放，内存占用与图片总数无关；解码、检测和裁剪在后台线程中运行，
+    通过容量为 prefetch（默认 batch_size，0 表示不使用后台线程）的队列领先 OCR。
+    每张车票解析后立即追加写入 output_dir/results.jsonl（可选 csv_path），每张图片另存一个 JSON，
+    结束时输出吞吐量和各阶段耗时分位数表；resume 为 True 时跳过 results.jsonl 中已完成的图片。
+    events_path 不为空时为每张图片输出一行 JSON 诊断事件；ocr_cache 为 OCRCache 时复用已缓存的OCR结果；
+    ocr_pool 为 OCRWorkerPool 时裁剪图交给多进程识别；ocr_batch_size > 1 时同一批图片的所有裁剪图统一批量 OCR；
+    station_index 为 StationIndex 时用车站名录校验和纠正站名；
+    preprocessor 为 Preprocessor 时以降低的分辨率解码检测，检测框映射回裁剪分辨率，裁剪图缩放到目标高度后再 OCR；
+    cascade 为 OCRCascade 时逐张图片级联识别（不跨图片批量 OCR），结束时输出升级比例；
+    crop_index 为 CropHashIndex 时近重复的裁剪图（同一张车票的多次拍摄）复用此前的OCR记录；
+    ticket_index 为 TicketDedupeIndex 时为重复的车票写入 duplicate_of 字段（续跑时先登记已有结果）；
+    layout 为 True 时按文本框位置解析车票（layout_parser）
+    """
+    if timer is None:
+        timer = StageTimer()
+    images = collect_images(sources)
+    os.makedirs(output_dir, exist_ok=True)
+    results_path = os.path.join(output_dir, "results.jsonl")
+    writer = TicketWriter(results_path, csv_path=csv_path, resume=resume)
+    if ticket_index is not None and resume and os.path.exists(results_path):
+        ticket_index.load_jsonl(results_path)
+    skipped = len(images)
+    images = [image_path for image_path in images if not writer.is_done(image_path)]
+    skipped -= len(images)
+    if skipped:
+        logger.info("续跑：跳过 %d 张已完成的图片", skipped)
+    if not images:
+        logger.warning("没有找到待处理的图片")
+        writer.close()
+        return {"images": 0, "tickets": 0, "skipped": skipped, "elapsed": 0.0}
+
+    yolo_model, ocr = load_models(model_path, with_ocr=ocr_pool is None)
+
+    # 用 with 保证运行中途出错时事件文件也会关闭（已写出的事件都已 flush）
+    with EventLog(events_path) as events:
+        start = time.perf_counter()
+        if prefetch is None:
+            prefetch = batch_size
+        try:
+            items = crop_stage(detect_stage(decode_stage(images, preprocessor), yolo_model, batch_size), debug_dump)
+            items = bounded(items, prefetch, name="detect")
+            items = parse_stage(ocr_stage(items, ocr, batch_size=batch_size, ocr_cache=ocr_cache, ocr_pool=ocr_pool,
+                                          ocr_batch_size=ocr_batch_size, ocr_max_pixels=ocr_max_pixels,
+                                          station_index=station_index, cascade=cascade, crop_index=crop_index,
+                                          layout=layout),
+                                station_index, layout)
+            for item in items:
+                image_path, tickets = item.path, item.tickets
+                duplicates = ticket_index.flag(image_path, tickets) if ticket_index is not None else 0
+
+                # 立即写出本图片的车票，并单独保存一份图片级结果
+                with item.timer.stage("write"):
+                    writer.write_image(image_path, tickets)
+                    stem = os.path.splitext(os.path.basename(image_path))[0]
+                    with open(os.path.join(output_dir, f"{stem}.json"), "w", encoding="utf-8") as f:
+                        json.dump({"image": image_path, "tickets": tickets}, f, ensure_ascii=False, indent=2)
+                durations = item.timer.end_image()
+                durations.pop("total")
+                durations = timer.record_image(image_path, durations)
+
+                logger.info("%s: 检测到 %d 张车票", image_path, len(tickets))
+                if duplicates:
+                    logger.warning("%s: %d 张车票与此前的车票重复", image_path, duplicates)
+                events.emit("image", image=image_path, detections=len(tickets), duplicates=duplicates,
+                            durations={stage: round(seconds, 4) for stage, seconds in durations.items()},
+                            empty_fields={ticket["detection_id"]: empty_fields(ticket) for ticket in tickets})
+        finally:
+            writer.close()
+        elapsed = time.perf_counter() - start
+
+        ticket_count = writer.tickets_written
+        logger.info("共处理 %d 张图片，识别 %d 张车票，耗时 %.2fs，%.2f images/sec",
+                    len(images), ticket_count, elapsed, len(images) / elapsed)
+        logger.info("解析结果已写入 %s", results_path)
+        logger.info("各阶段耗时（毫秒/图）:\n%s", timer.format_summary())
+        peak_rss = peak_rss_mb()
+        logger.info("峰值内存 %.0f MB", peak_rss)
+        if ocr_cache is not None:
+            logger.info("OCR缓存命中 %d 次，未命中 %d 次", ocr_cache.hits, ocr_cache.misses)
+        if cascade is not None:
+            logger.info("级联识别：%d 张车票中 %d 张升级到重型OCR（%.1f%%）",
+                        cascade.tickets, cascade.escalated, cascade.escalation_rate * 100)
+        if crop_index is not None:
+            logger.info("近重复裁剪图复用OCR结果 %d 次，识别 %d 次", crop_index.hits, crop_index.misses)
+        if ticket_index is not None:
+            logger.info("发现 %d 张重复车票", ticket_index.duplicates)
+        events.emit("batch", images=len(images), tickets=ticket_count, elapsed=round(elapsed, 4),
+                    stages={name: {key: round(value, 4) for key, value in row.items()}
+                            for name, row in timer.summary().items()},
+                    cascade=cascade.summary() if cascade is not None else None,
+                    duplicates=ticket_index.duplicates if ticket_index is not None else None,
+                    peak_rss_mb=round(peak_rss, 1))
+    return {"images": len(images), "tickets": ticket_count, "skipped": skipped, "elapsed": elapsed}
 
 
 if __name__ == '__main__':
-    process_ticket_recognition()
+    parser = argparse.ArgumentParser(description="车票检测与OCR信息抽取")
+    parser.add_argument("sources", nargs="*", help="图片目录、通配符或文件列表；为空时处理 222.png")
+    parser.add_argument("--model", default=r'best.pt', help="YOLO 模型路径")
+    parser.add_argument("--batch-size", type=int, default=8, help="每次送入 YOLO 的图片数")
+    parser.add_argument("--prefetch", type=int,
+                        help="解码/检测/裁剪最多领先 OCR 的图片数（默认等于 --batch-size，0 表示不使用后台线程）")
+    parser.add_argument("--output-dir", default="output/batch", help="批处理结果输出目录")
+    parser.add_argument("--debug-dump", action="store_true", help="把裁剪图和原始OCR结果写入 output/ 便于调试")
+    parser.add_argument("--csv", help="同时把每张车票追加写入该 CSV 文件")
+    parser.add_argument("--resume", action="store_true", help="跳过 results.jsonl 中已完成的图片，继续上次中断的运行")
+    parser.add_argument("--events", help="JSON-lines 诊断事件输出文件")
+    parser.add_argument("--ocr-cache", help="OCR结果缓存文件（SQLite），按裁剪图内容复用OCR结果")
+    parser.add_argument("--ocr-cache-size", type=int, default=DEFAULT_MAX_BYTES // (1024 * 1024), help="OCR缓存上限（MB）")
+    parser.add_argument("--ocr-batch-size", type=int, default=1,
+                        help="大于 1 时把同一批图片的所有裁剪图按此数量批量 OCR")
+    parser.add_argument("--ocr-max-pixels", type=int, default=DEFAULT_OCR_MAX_PIXELS, help="每次批量 OCR 的像素总量上限")
+    parser.add_argument("--ocr-workers", type=int, default=0, help="OCR 进程数，0 表示在主进程内识别")
+    parser.add_argument("--ocr-threads", type=int, default=1, help="每个 OCR 进程的 CPU 线程数")
+    parser.add_argument("--stations", nargs="?", const=STATIONS_PATH,
+                        help="用车站名录校验和纠正站名（不带路径时使用 data/stations.txt）")
+    parser.add_argument("--train-index", help="历史抽取结果 JSON，用于建立车次途经站索引（配合 --stations）")
+    parser.add_argument("--detect-scale", type=int, choices=REDUCED_SCALES,
+                        help="以 1/N 分辨率解码图片用于检测（JPEG 解码时直接缩小），启用预处理")
+    parser.add_argument("--crop-scale", type=int, choices=REDUCED_SCALES, default=DEFAULT_CROP_SCALE,
+                        help="预处理时以 1/N 分辨率解码用于裁剪")
+    parser.add_argument("--crop-height", type=int, default=DEFAULT_CROP_HEIGHT,
+                        help="预处理时把裁剪图缩放到该高度后再 OCR（较矮的最多放大 2 倍，0 表示不缩放）")
+    parser.add_argument("--cascade", action="store_true",
+                        help="级联识别：先用移动端模型识别缩小的裁剪图，低置信度或缺字段的车票再用完整配置识别")
+    parser.add_argument("--cascade-min-confidence", type=float, default=DEFAULT_MIN_CONFIDENCE,
+                        help="级联识别中必填字段的最低置信度")
+    parser.add_argument("--fast-crop-height", type=int, default=DEFAULT_FAST_CROP_HEIGHT,
+                        help="级联识别快速阶段的裁剪图高度（0 表示不缩放）")
+    parser.add_argument("--dedupe-crops", action="store_true",
+                        help="按感知哈希（dHash）识别近重复的裁剪图，复用此前的OCR结果")
+    parser.add_argument("--dedupe-distance", type=int, default=DEFAULT_MAX_DISTANCE,
+                        help="近重复裁剪图的最大哈希汉明距离（256 位）")
+    parser.add_argument("--no-flag-duplicates", action="store_true",
+                        help="不按车次+发车时间+车厢+座位号标记重复车票（duplicate_of 字段）")
+    parser.add_argument("--layout", action="store_true",
+                        help="按文本框位置解析车票（版面解析），代替按文本顺序解析")
+    parser.add_argument("--profile", choices=("cprofile", "pyinstrument"), help="对整个运行过程做性能剖析")
+    parser.add_argument("--profile-output", help="剖析结果文件（cProfile 为 .prof，pyinstrument 为 .html）")
+    parser.add_argument("-v", "--verbose", action="count", default=0, help="输出每个文本块和解析字段")
+    parser.add_argument("-q", "--quiet", action="store_true", help="只输出警告和错误")
+    args = parser.parse_args()
+    setup_logging(-1 if args.quiet else args.verbose)
+
+    preprocessor = Preprocessor(args.detect_scale, args.crop_scale, args.crop_height) if args.detect_scale else None
+    cascade = None
+    if args.cascade:
+        cascade = OCRCascade(load_ocr(**FAST_OCR_OVERRIDES), args.cascade_min_confidence, args.fast_crop_height)
+    station_index = StationIndex.load(args.stations, args.train_index) if args.stations else None
+    crop_index = CropHashIndex(args.dedupe_distance) if args.dedupe_crops else None
+    ticket_index = None if args.no_flag_duplicates else TicketDedupeIndex()
+    cache = open_ocr_cache(args.ocr_cache, args.ocr_cache_size * 1024 * 1024) if args.ocr_cache else None
+    pool = None
+    if args.ocr_workers > 0:
+        from ocr_pool import OCRWorkerPool
+        pool = OCRWorkerPool(args.ocr_workers, threads_per_worker=args.ocr_threads)
+    try:
+        with profiled(args.profile, args.profile_output):
+            if args.sources:
+                process_ticket_batch(args.sources, model_path=args.model, output_dir=args.output_dir,
+                                     batch_size=args.batch_size, debug_dump=args.debug_dump, events_path=args.events,
+                                     ocr_cache=cache, ocr_pool=pool, ocr_batch_size=args.ocr_batch_size,
+                                     ocr_max_pixels=args.ocr_max_pixels, csv_path=args.csv, resume=args.resume,
+                                     station_index=station_index, preprocessor=preprocessor, cascade=cascade,
+                                     crop_index=crop_index, ticket_index=ticket_index, prefetch=args.prefetch,
+                                     layout=args.layout)
+            else:
+                process_ticket_recognition(model_path=args.model, debug_dump=args.debug_dump, ocr_cache=cache,
+                                           ocr_pool=pool, station_index=station_index, preprocessor=preprocessor,
+                                           cascade=cascade, crop_index=crop_index, csv_path=args.csv,
+                                           resume=args.resume, layout=args.layout)
+    finally:
+        if pool is not None:
+            pool.close()
+        if cache is not None:
+            cache.close()